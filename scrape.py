@@ -1,32 +1,90 @@
+import argparse
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scraper.base import BaseScraper
 from services.loader import load_scrapers
+from services.cache import http_cache
 from services.database import DatabasePipeline
+from services.throttle import host_throttle
+
+MAX_WORKERS = 4  # scrapers running at the same time
+PER_HOST    = 2  # requests in flight against a single host
+BATCH_SIZE  = 10 # letters committed together while a scraper is still running
+
+
+def scrape_into(scraper, db: DatabasePipeline, limit: Optional[int] = None, batch_size: int = BATCH_SIZE) -> int:
+    count = 0
+    batch = []
+
+    try:
+        for letter in scraper.iter_scrape(limit=limit):
+            batch.append(letter)
+            count += 1
+
+            if len(batch) >= batch_size:
+                db.store_many(batch)
+                batch = []
+
+                # every letter yielded so far is stored, so finished pages can be checkpointed
+                scraper.flush_checkpoint()
+
+    finally:
+        # keep whatever was downloaded even if the scraper fails halfway
+        db.store_many(batch)
+        scraper.flush_checkpoint()
+
+    return count
 
 
-def run():
+def run(limit: Optional[int] = None, max_workers: int = MAX_WORKERS, per_host: int = PER_HOST, use_cache: bool = True, full: bool = False):
     count = 0
     db = DatabasePipeline()
 
-    for ScraperClass in load_scrapers():        
-        scraper = ScraperClass(pipeline=db)
-        
-        try:
-            letters = scraper.scrape(limit=None)
-            len_letters = len(letters)
-            count += len_letters
-
-            print(f"{scraper.gestora} ({len_letters})")
-            
-            for letter in letters:
-                db.store(letter)
-        
-        except Exception as e:
-            print(f"Error in scraper {scraper.gestora}: {e}")
+    host_throttle.configure(per_host)
+    http_cache.enabled = use_cache
+
+    scrapers = [ScraperClass(pipeline=db) for ScraperClass in load_scrapers()]
+
+    for scraper in scrapers:
+        # incremental runs stop paginating at the first page with nothing new,
+        # full runs walk every page from the first one, whatever the checkpoint says
+        scraper.early_stop = not full
+        scraper.resume = not full
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(scrape_into, scraper, db, limit): scraper for scraper in scrapers}
+
+            for future in as_completed(futures):
+                scraper = futures[future]
+
+                try:
+                    len_letters = future.result()
+                    count += len_letters
+
+                    print(f"{scraper.gestora} ({len_letters})")
+
+                except Exception as e:
+                    print(f"Error in scraper {scraper.gestora}: {e}")
+
+    finally:
+        # the aiohttp session is shared by every scraper for the whole run
+        BaseScraper.close_async()
 
     print(f"Total: {count} new letters")
-    
+
     total = db.count_all_letters()
     print(f"Total letters in database: {total}")
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Scrape letters from every gestora')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum number of letters per scraper')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Number of scrapers running concurrently')
+    parser.add_argument('--per-host', type=int, default=PER_HOST, help='Concurrent requests allowed per host')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk HTTP cache')
+    parser.add_argument('--full', action='store_true', help='Walk every listing page from page 1, ignoring early stop and resume checkpoints')
+    args = parser.parse_args()
+
+    run(limit=args.limit, max_workers=args.workers, per_host=args.per_host, use_cache=not args.no_cache, full=args.full)
@@ -1,7 +1,14 @@
 import time
+import asyncio
+import aiohttp
+import threading
 import requests
 from bs4 import BeautifulSoup
-from typing import Optional
+from typing import Dict, Iterator, List, Optional
+
+from services.cache import http_cache
+from services.extractor import parse_pool, read_pdf
+from services.throttle import host_throttle
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
@@ -12,6 +19,14 @@ HEADERS = {
 class BaseScraper:
 
     MAX_RETRIES = 3
+    MAX_IN_FLIGHT = 16
+
+    # one event loop on a background thread and one aiohttp session (keep-alive pool) on it,
+    # shared by every scraper and every page until close_async() at the end of the run
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_thread: Optional[threading.Thread] = None
+    _loop_lock = threading.Lock()
+    _client_session: Optional[aiohttp.ClientSession] = None
 
     def __init__(self, headers=None) -> None:
         self.headers = headers or HEADERS
@@ -19,6 +34,14 @@ class BaseScraper:
         self.session = requests.Session()
         self.session.headers.update(self.headers)
 
+        self.known_titles: Optional[set] = None  # loaded from the pipeline on first use
+
+        self.early_stop: bool = False  # stop paginating at the first page with nothing new
+        self.resume: bool = True       # continue an interrupted backfill from its checkpoint
+        self.resuming: bool = False
+
+        self.pending_checkpoint: Optional[tuple] = None  # written by flush_checkpoint()
+
     def should_skip(self, title: Optional[str]) -> bool:
         if not hasattr(self, 'pipeline') or not hasattr(self, 'gestora'):
             raise AttributeError("Scraper must have 'pipeline' and 'gestora' attributes.")
@@ -26,17 +49,51 @@ class BaseScraper:
         if not title:
             return True
         
-        exists, _, content = self.pipeline.exists(self.gestora, title)
+        if self.known_titles is None:
+            self.known_titles = self.pipeline.known_titles(self.gestora)
         
-        return exists and content # skip if content exists
+        return title in self.known_titles # skip if content exists
+
+    def start_page(self) -> int:
+        """First listing page to visit: where an interrupted backfill stopped, otherwise page 1."""
+        if not self.resume:
+            return 1
+
+        checkpoint = self.pipeline.checkpoint(self.gestora)
+
+        if checkpoint and not checkpoint["complete"]:
+            self.resuming = True
+            return checkpoint["last_page"]
+
+        return 1
+
+    def save_checkpoint(self, page: int, url: str, complete: bool = False) -> None:
+        """
+        Marks `page` as done once all of its letters were yielded. The consumer may still
+        hold some of them unsaved, so it calls flush_checkpoint() after storing them.
+        """
+        self.pending_checkpoint = (page, url, complete)
+
+    def flush_checkpoint(self) -> None:
+        """Writes the last pending checkpoint; every letter yielded before it must already be stored."""
+        if self.pending_checkpoint is not None:
+            self.pipeline.save_checkpoint(self.gestora, *self.pending_checkpoint)
+            self.pending_checkpoint = None
+
+    def page_known(self, titles: List[Optional[str]]) -> bool:
+        """True when early stopping is on and every title of a listing page is already stored."""
+        if not self.early_stop or self.resuming or not titles:
+            return False # a resumed backfill has to reach the last page
+
+        return all(self.should_skip(title) for title in titles)
 
     def parse(self, url: str, verify: bool = True) -> Optional[BeautifulSoup]:
         for attempt in range(1, self.MAX_RETRIES + 1):
             try:
-                response = self.session.get(url, verify=verify, timeout=10)
-                response.raise_for_status()
+                with host_throttle.slot(url):
+                    content = http_cache.get(self.session, url, verify=verify, timeout=10)
                 
-                return BeautifulSoup(response.content, "html.parser")
+                return BeautifulSoup(content, "html.parser")
 
             except requests.RequestException as e:
                 if attempt < self.MAX_RETRIES:
@@ -50,6 +107,141 @@ class BaseScraper:
 
                     return None
 
-    def scrape(self):
-        raise NotImplementedError(
-            "O método scrape() deve ser implementado pela subclasse.")
+    @classmethod
+    def _event_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._loop_lock:
+            if BaseScraper._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="scraper-io", daemon=True)
+                thread.start()
+
+                BaseScraper._loop, BaseScraper._loop_thread = loop, thread
+
+            return BaseScraper._loop
+
+    def _client(self) -> aiohttp.ClientSession:
+        # only called on the loop thread, so no lock is needed
+        client = BaseScraper._client_session
+
+        if client is None or client.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.MAX_IN_FLIGHT,                 # bounds in-flight requests
+                limit_per_host=host_throttle.per_host,
+                keepalive_timeout=30,
+            )
+
+            client = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+            BaseScraper._client_session = client
+
+        return client
+
+    def run_async(self, coro):
+        """Runs `coro` on the shared loop and blocks the calling scraper thread until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self._event_loop()).result()
+
+    @classmethod
+    def close_async(cls) -> None:
+        """Closes the shared session and stops its loop; the next run_async starts new ones."""
+        with cls._loop_lock:
+            loop, thread = BaseScraper._loop, BaseScraper._loop_thread
+            BaseScraper._loop = BaseScraper._loop_thread = None
+
+        if loop is None:
+            return
+
+        async def close_client():
+            if BaseScraper._client_session is not None:
+                await BaseScraper._client_session.close()
+                BaseScraper._client_session = None
+
+        asyncio.run_coroutine_threadsafe(close_client(), loop).result()
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    async def fetch(self, url: str, verify: bool = True) -> Optional[bytes]:
+        client = self._client()
+
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            try:
+                # the cache does SQLite and file I/O under a lock shared with every scraper
+                # thread, keep it off the loop that serves all in-flight requests
+                headers = {**self.headers, **await asyncio.to_thread(http_cache.validators, url)}
+
+                # same per-host cap as the blocking requests of every other scraper thread
+                async with host_throttle.aslot(url), client.get(url, headers=headers, ssl=verify) as response:
+                    if response.status == 304:
+                        content = await asyncio.to_thread(http_cache.load, url)
+
+                        if content is None:
+                            raise aiohttp.ClientError(f"cache entry for {url} is gone")
+
+                        return content
+
+                    response.raise_for_status()
+                    content = await response.read()
+
+                await asyncio.to_thread(http_cache.store, url, content, response.headers)
+
+                return content
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt < self.MAX_RETRIES:
+                    sleep_time = 2 ** (attempt - 1)
+                    print(f"[INFO] Retrying in {sleep_time} seconds...")
+
+                    await asyncio.sleep(sleep_time)
+
+                else:
+                    print(f"[ERROR] All {self.MAX_RETRIES} attempts failed for {url}")
+
+                    return None
+
+    async def aparse(self, url: str, verify: bool = True) -> Optional[BeautifulSoup]:
+        content = await self.fetch(url, verify=verify)
+
+        if content is None:
+            return None
+
+        # building the tree is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(BeautifulSoup, content, "html.parser")
+
+    async def fetch_pdf(self, url: str, verify: bool = True, verbose: bool = True) -> Optional[str]:
+        content = await self.fetch(url, verify=verify)
+
+        if content is None:
+            return None
+
+        try:
+            # pypdf holds the GIL, so pages are extracted in the shared process pool
+            loop = asyncio.get_running_loop()
+
+            return await loop.run_in_executor(parse_pool(), read_pdf, content)
+
+        except Exception as e:
+            if verbose:
+                print(f"Failed to extract text from PDF at {url}: {str(e)}")
+
+            return None
+
+    def iter_scrape(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yields letters as soon as each one is ready, so callers can persist them
+        incrementally. Scrapers that only implement scrape() are adapted here.
+        """
+        if type(self).scrape is BaseScraper.scrape:
+            raise NotImplementedError(
+                "O método iter_scrape() ou scrape() deve ser implementado pela subclasse.")
+
+        yield from self.scrape(limit=limit)
+
+    def scrape(self, limit: Optional[int] = None) -> List[Dict]:
+        if type(self).iter_scrape is BaseScraper.iter_scrape:
+            raise NotImplementedError(
+                "O método scrape() deve ser implementado pela subclasse.")
+
+        letters = list(self.iter_scrape(limit=limit))
+        self.flush_checkpoint()
+
+        return letters
@@ -1,6 +1,6 @@
 import re
 from random import sample
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, Optional
 
 from ..base import BaseScraper
 from ..utils import extract_date
@@ -20,11 +20,11 @@ class DynamoScraper(BaseScraper):
         self.gestora: str = "Dynamo"
         self.base_url: str = "https://www.dynamo.com.br/cartas-dynamo"
     
-        self.letters: List[Dict] = []  # initialize as empty list
         self.pipeline = pipeline
 
-    def scrape(self, limit: Optional[int] = None) -> List[Dict]:
-        page = 1
+    def iter_scrape(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        count = 0
+        page = self.start_page()
         has_content = True
 
         while has_content:
@@ -49,6 +49,9 @@ class DynamoScraper(BaseScraper):
             if not items:
                 break
 
+            if self.page_known([item.find("h3").get_text(strip=True) for item in items]):
+                break # everything older is already stored
+
             for item in items:
                 span = item.find("span", class_="carta-n").find("a")
                 pdf_url = "https://www.dynamo.com.br/" + span["href"]
@@ -83,14 +86,16 @@ class DynamoScraper(BaseScraper):
                     "content": text
                 }
 
-                self.letters.append(letter)
+                yield letter
+                count += 1
 
-                if limit and len(self.letters) >= limit:
-                    return self.letters
+                if limit and count >= limit:
+                    return
                 
+            self.save_checkpoint(page, url)
             page += 1
 
-        return self.letters
+        self.save_checkpoint(page, url, complete=True)
     
 
 if __name__ == "__main__":
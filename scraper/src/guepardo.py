@@ -1,5 +1,5 @@
 import re
-from typing import Optional
+from typing import Dict, Iterator, Optional
 
 from ..base import BaseScraper
 from ..utils import extract_date
@@ -20,8 +20,9 @@ class GuepardoScraper(BaseScraper):
         self.pipeline = pipeline
 
     def extract_text(self, url: str, title: str) -> str:
-        text = pdf.extract_text(url)
+        return self.clean_text(pdf.extract_text(url), title)
 
+    def clean_text(self, text: str, title: str) -> str:
         if text:
             text = text.replace(title, "")
             text = re.sub(r'Guepardo Investimentos.*?\+55 \(11\) 3103-9200', '', text, flags=re.DOTALL)
@@ -31,12 +32,13 @@ class GuepardoScraper(BaseScraper):
 
         return text
 
-    def scrape(self, limit: Optional[int] = None):
-        letters = []
+    def iter_scrape(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        count = 0
         
         soup = self.parse(self.base_url)
         
         baixar_links = soup.find_all("span", string=lambda s: s and "baixar pdf" in s.lower())
+        reports = []
      
         for span in baixar_links:
             title_tag = span.find_previous(lambda tag: tag.name in ["h3"] and "Relatório de Gestão" in tag.get_text())
@@ -51,22 +53,30 @@ class GuepardoScraper(BaseScraper):
                 continue
 
             href = span.find_previous("a").get("href")
-            
             date = extract_date(date_tag.get_text(strip=True))
-            text = self.extract_text(href, title_tag.get_text(strip=True))
 
+            reports.append((title, title_tag.get_text(strip=True), date, href))
+
+            if limit and len(reports) >= limit:
+                break
+
+        # download and parse every report in parallel, results come back in order
+        texts = pdf.extract_many(href for _, _, _, href in reports)
+
+        for (title, report_title, date, href), text in zip(reports, texts):
             letter = {
                 "gestora": self.gestora,
                 "title": title,
                 "date": date,
                 "url": href,
-                "content": text
+                "content": self.clean_text(text, report_title)
             }
 
-            letters.append(letter)
+            yield letter
+            count += 1
             
-            if limit and len(letters) >= limit:
-                return letters # for testing purposes
+            if limit and count >= limit:
+                return # for testing purposes
 
         for li in soup.find_all("li"):
             span = li.find("span", class_="elementor-icon-list-text")
@@ -74,7 +84,7 @@ class GuepardoScraper(BaseScraper):
             if span and "Carta aos Investidores" in span.get_text():
                 title = span.get_text(strip=True)
                 
-                if self.pipeline.exists(self.gestora, title):
+                if self.should_skip(title):
                     continue
                 
                 url = li.find("a", href=True)["href"]
@@ -89,9 +99,7 @@ class GuepardoScraper(BaseScraper):
                     "content": text
                 }
 
-                letters.append(letter)
-
-        return letters
+                yield letter
 
 
 if __name__ == "__main__":
@@ -1,14 +1,12 @@
+import asyncio
 import urllib3
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, Optional
 
 from ..base import BaseScraper
 from ..utils import extract_date
 from services.database import DatabasePipeline, DummyPipeline
-from services.extractor import PDFTextService
 
 
-pdf = PDFTextService()
-
 class IPCapitalScrape(BaseScraper):
 
     def __init__(self, pipeline: DatabasePipeline):
@@ -17,17 +15,15 @@ class IPCapitalScrape(BaseScraper):
         
         self.gestora = "IP Capital"
         self.base_url = "https://ip-capitalpartners.com/wp-content/themes/ip-capital/loop-reports.php"
-        self.letters = []  # initialize as empty list
-
         self.pipeline = pipeline
 
-    def get_urls(self, limit: Optional[int] = None) -> list[tuple[str, str]]:
-        results = []
-        page = 1
+    def iter_pages(self) -> Iterator[tuple[int, str, list[tuple[str, str]]]]:
+        page = self.start_page()
         has_content = True
 
         while has_content:
             url = f"{self.base_url}?paged={page}"
+            results = []
 
             soup = self.parse(url, verify=False)
             cards = soup.find_all("div", class_="card")
@@ -40,8 +36,7 @@ class IPCapitalScrape(BaseScraper):
                 if pdf_link and pdf_link['href'].endswith('.pdf'):
                     results.append((f'{title} ({date})', pdf_link['href']))
 
-                    if limit and len(results) >= limit:
-                        return results # for testing purposes
+            yield page, url, results
 
             load_more = soup.find('a', class_='load-more')
             
@@ -50,34 +45,53 @@ class IPCapitalScrape(BaseScraper):
 
             page += 1
 
-        return results
+    async def _fetch_texts(self, results: list[tuple[str, str]]) -> list[Optional[str]]:
+        # downloads overlap on the shared pool instead of running one after another
+        return await asyncio.gather(*(self.fetch_pdf(pdf_url, verify=False) for _, pdf_url in results))
 
-    def scrape(self, limit: Optional[int] = None) -> List[Dict]:
-        results = self.get_urls(limit=limit)
-        
-        for title, pdf_url in results:
-            
-            if self.should_skip(title):
-                continue
+    def iter_scrape(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        count = 0
+        page, url = None, None
+
+        for page, url, results in self.iter_pages():
+            if self.page_known([title for title, _ in results]):
+                break # everything older is already stored
 
-            try:
-                date = extract_date(title)
-                text = pdf.extract_text(pdf_url, verify=False)
+            pending = [(title, pdf_url) for title, pdf_url in results if not self.should_skip(title)]
+
+            if limit:
+                pending = pending[:limit - count] # for testing purposes
+
+            # every PDF of a listing page is downloaded at once
+            texts = self.run_async(self._fetch_texts(pending))
+            
+            for (title, pdf_url), text in zip(pending, texts):
                 
-                letter = {
-                    "gestora": self.gestora,
-                    "title": title,
-                    "date": date,
-                    "url": pdf_url,
-                    "content": text
-                }
-
-                self.letters.append(letter)
-
-            except Exception as e:
-                print(f"Failed to process {pdf_url}: {str(e)}")
-        
-        return self.letters
+                try:
+                    date = extract_date(title)
+                    
+                    letter = {
+                        "gestora": self.gestora,
+                        "title": title,
+                        "date": date,
+                        "url": pdf_url,
+                        "content": text
+                    }
+
+                except Exception as e:
+                    print(f"Failed to process {pdf_url}: {str(e)}")
+                    continue
+
+                yield letter
+                count += 1
+
+            if limit and count >= limit:
+                return
+
+            self.save_checkpoint(page, url)
+
+        if page is not None:
+            self.save_checkpoint(page, url, complete=True)
 
 if __name__ == "__main__":
     scraper = IPCapitalScrape(pipeline=DummyPipeline())
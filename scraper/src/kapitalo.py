@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, Optional
 
 from ..utils import extract_date
 from ..base import BaseScraper
@@ -17,10 +17,10 @@ class KapitaloScraper(BaseScraper):
         self.gestora: str = "Kapitalo"
         self.base_url: str = "https://www.kapitalo.com.br/carta-do-gestor/kapa-e-zeta/"
     
-        self.letters: List[Dict] = []  # initialize as empty list
         self.pipeline = pipeline
 
-    def scrape(self, limit: Optional[int] = None) -> List[Dict]:
+    def iter_scrape(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        count = 0
         soup = self.parse(self.base_url)
         section = soup.find("ul", class_="cartasGestor")
         items = section.find_all("li")
@@ -32,9 +32,11 @@ class KapitaloScraper(BaseScraper):
             month_text = item.find("p", class_="date").get_text(strip=True)
             date_text = extract_date(href.split("/")[-1].split(".")[0])
 
-            text = pdf.extract_text(href)
+            text = None
 
             if not date_text:
+                # the date is only available inside the PDF
+                text = pdf.extract_text(href)
                 date_text = extract_date(text[:100])
 
                 if not date_text:
@@ -45,6 +47,9 @@ class KapitaloScraper(BaseScraper):
             if self.should_skip(title):
                 continue
 
+            if text is None:
+                text = pdf.extract_text(href)
+
             letter = {
                 "gestora": self.gestora,
                 "title": title,
@@ -53,12 +58,11 @@ class KapitaloScraper(BaseScraper):
                 "content": text
             }
 
-            self.letters.append(letter)
-
-            if limit and len(self.letters) >= limit:
-                return self.letters # for testing purposes
+            yield letter
+            count += 1
 
-        return self.letters
+            if limit and count >= limit:
+                return # for testing purposes
     
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ import numpy as np
 from typing import List, Dict, Any, Tuple, Optional
 from contextlib import contextmanager
 from datasets import Dataset
-from transformers import AutoTokenizer, BertForSequenceClassification, pipeline
+from transformers import AutoTokenizer, BertForSequenceClassification
 
 class SentimentAnalysis:
     def __init__(self, db_path: Optional[str] = "letters.db", model_name: str = "lucas-leme/FinBERT-PT-BR"):
@@ -17,13 +17,8 @@ class SentimentAnalysis:
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = BertForSequenceClassification.from_pretrained(model_name)
         
-        self.pipeline = pipeline(
-            task='text-classification',
-            model=self.model,
-            tokenizer=self.tokenizer,
-            top_k=None,
-            device=0 if torch.cuda.is_available() else -1
-        )
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model.to(self.device).eval()
         
         if self.db_path:
             self._alter_table()
@@ -74,30 +69,29 @@ class SentimentAnalysis:
             return [dict(zip(columns, row)) for row in rows]
     
 
-    def calculate_score(self, prob: list[list[dict]], alpha: float = 0.5, slope: Optional[float] = None, normalized: bool = True) -> int:
-        self.scores = np.array([])
-        self.weights = np.array([])
+    def calculate_score(self, prob: list[list[dict]] | np.ndarray, alpha: float = 0.5, slope: Optional[float] = None, normalized: bool = True) -> int:
+        """`prob` is either the pipeline output or an (n_chunks, n_labels) probability matrix."""
+        if isinstance(prob, np.ndarray):
+            label2id = self.model.config.label2id
 
-        for chunk in prob:
-            label_scores = {d['label']: d['score'] for d in chunk}
+            p_pos = prob[:, label2id['POSITIVE']].astype(np.float64)
+            p_neg = prob[:, label2id['NEGATIVE']].astype(np.float64)
 
-            p_pos = label_scores['POSITIVE']
-            p_neg = label_scores['NEGATIVE']
+        else:
+            label_scores = [{d['label']: d['score'] for d in chunk} for chunk in prob]
 
-            # polarity: s_i = p_pos - p_neg
-            s_i = p_pos - p_neg
-            
-            # weight: w_i = p_pos + p_neg
-            w_i = p_pos + p_neg
+            p_pos = np.array([d['POSITIVE'] for d in label_scores], dtype=np.float64)
+            p_neg = np.array([d['NEGATIVE'] for d in label_scores], dtype=np.float64)
 
-            if normalized and w_i > 0:
-                p_norm_pos = p_pos / w_i
-                p_norm_neg = p_neg / w_i
-                s_i = p_norm_pos - p_norm_neg
+        # polarity: s_i = p_pos - p_neg
+        self.scores = p_pos - p_neg
 
-            self.scores = np.append(self.scores, s_i)
-            self.weights = np.append(self.weights, w_i)
+        # weight: w_i = p_pos + p_neg
+        self.weights = p_pos + p_neg
 
+        if normalized:
+            # p_pos / w_i - p_neg / w_i, for chunks with any weight
+            self.scores = np.divide(self.scores, self.weights, out=self.scores.copy(), where=self.weights > 0)
 
         if len(self.weights) == 0 or self.weights.sum() == 0:
             return 50
@@ -118,6 +112,19 @@ class SentimentAnalysis:
 
         return final_score
 
+    def predict_proba(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """(n, n_labels) class probabilities, columns ordered as `model.config.id2label`."""
+        probs = []
+
+        with torch.inference_mode():
+            for i in range(0, len(texts), batch_size):
+                inputs = self.tokenizer(texts[i:i + batch_size], padding=True, truncation=True, max_length=512, return_tensors="pt")
+                logits = self.model(**inputs.to(self.device)).logits
+
+                probs.append(torch.softmax(logits.float(), dim=-1).cpu().numpy())
+
+        return np.concatenate(probs) if probs else np.zeros((0, self.model.config.num_labels), dtype=np.float32)
+
     def predict_sentiment(self, letters: List[Dict[str, Any]]) -> None:
         dataset = Dataset.from_list(letters)
 
@@ -145,7 +152,7 @@ class SentimentAnalysis:
             chunk_dataset = Dataset.from_dict({"text": chunks})
             text_list = chunk_dataset["text"]
 
-            prob = self.pipeline(text_list, batch_size=64)
+            prob = self.predict_proba(text_list, batch_size=64)
             score = self.calculate_score(prob, alpha=0.75, normalized=True)
 
             return {"sentiment": score}
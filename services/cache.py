@@ -0,0 +1,185 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+CACHE_DIR = os.path.join(".cache", "http")
+MAX_SIZE  = 2 * 1024 ** 3  # bytes kept on disk before least recently used entries are evicted
+
+
+class HTTPCache:
+    """
+    On-disk cache for listing pages and PDFs.
+
+    Bodies are stored once per content hash under `blobs/`, and a small SQLite index
+    maps each URL to its blob and validators (ETag / Last-Modified). Cached URLs are
+    revalidated with conditional GETs, so an unchanged page costs a 304 instead of
+    a full download.
+    """
+
+    def __init__(self, path: str = CACHE_DIR, max_size: int = MAX_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.enabled = True
+
+        self.lock = threading.RLock()
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(os.path.join(self.path, "blobs"), exist_ok=True)
+
+            self.conn = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER,
+                    accessed REAL
+                )
+            ''')
+
+            self.conn.commit()
+
+        return self.conn
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest)
+
+    def _drop_unreferenced(self, digest: str) -> bool:
+        """Removes a blob once no URL points at it; blobs are shared between URLs serving the same bytes."""
+        if self._connect().execute('SELECT 1 FROM entries WHERE digest = ?', (digest,)).fetchone() is not None:
+            return False
+
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+        return True
+
+    def validators(self, url: str) -> Dict[str, str]:
+        if not self.enabled:
+            return {}
+
+        with self.lock:
+            row = self._connect().execute(
+                'SELECT digest, etag, last_modified FROM entries WHERE url = ?', (url,)
+            ).fetchone()
+
+        if row is None or not os.path.exists(self._blob_path(row[0])):
+            return {}
+
+        headers = {}
+
+        if row[1]:
+            headers["If-None-Match"] = row[1]
+
+        if row[2]:
+            headers["If-Modified-Since"] = row[2]
+
+        return headers
+
+    def load(self, url: str) -> Optional[bytes]:
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            conn.execute('UPDATE entries SET accessed = ? WHERE url = ?', (time.time(), url))
+            conn.commit()
+
+        try:
+            with open(self._blob_path(row[0]), "rb") as f:
+                return f.read()
+
+        except FileNotFoundError:
+            return None
+
+    def store(self, url: str, content: bytes, headers) -> None:
+        if not self.enabled:
+            return
+
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+
+        if not etag and not last_modified:
+            return # nothing to revalidate against, caching would not save a request
+
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+
+        with self.lock:
+            conn = self._connect()
+            previous = conn.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+
+            if not os.path.exists(blob_path):
+                tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+
+                os.replace(tmp_path, blob_path)
+
+            conn.execute('''
+                INSERT OR REPLACE INTO entries (url, digest, etag, last_modified, size, accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (url, digest, etag, last_modified, len(content), time.time()))
+
+            conn.commit()
+
+            # a changed page points at a new blob, the old one would never be counted or evicted again
+            if previous is not None and previous[0] != digest:
+                self._drop_unreferenced(previous[0])
+
+            self._evict()
+
+    def _evict(self) -> None:
+        conn = self._connect()
+
+        total = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)'
+        ).fetchone()[0]
+
+        if total <= self.max_size:
+            return
+
+        for url, digest, size in conn.execute(
+            'SELECT url, digest, size FROM entries ORDER BY accessed'
+        ).fetchall():
+            conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+
+            if self._drop_unreferenced(digest):
+                total -= size
+
+            if total <= self.max_size:
+                break
+
+        conn.commit()
+
+    def get(self, session, url: str, **kwargs) -> bytes:
+        """GET `url` through a requests session, answering from the cache on 304."""
+        response = session.get(url, headers=self.validators(url), **kwargs)
+
+        if response.status_code == 304:
+            content = self.load(url)
+
+            if content is not None:
+                return content
+
+            response = session.get(url, **kwargs)
+
+        response.raise_for_status()
+        self.store(url, response.content, response.headers)
+
+        return response.content
+
+
+# shared by the scrapers and the PDF service
+http_cache = HTTPCache()
@@ -1,78 +1,168 @@
 import sqlite3
+import threading
+from typing import Optional
 
 class DatabasePipeline:
     
     def __init__(self, db_path='letters.db'):
-        self.conn = sqlite3.connect(db_path)
+        # scrapers run on worker threads, so the connection is shared behind a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+
+        # WAL lets readers run alongside the writer, NORMAL only fsyncs at checkpoints
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('PRAGMA cache_size = -65536')  # 64 MiB
+
         self._create_table()
         
     def _create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS letters (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                gestora TEXT,
-                title TEXT,
-                date TEXT,
-                url TEXT,
-                content TEXT
-            )
-        ''')
-
-        self.conn.commit()
-        
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    gestora TEXT,
+                    title TEXT,
+                    date TEXT,
+                    url TEXT,
+                    content TEXT
+                )
+            ''')
+
+            try:
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_letters_gestora_title ON letters (gestora, title)')
+
+            except sqlite3.IntegrityError:
+                # older databases may hold duplicated letters, keep the copy with the longest
+                # content (the first one on ties); NULL keys never collide in the index
+                cursor.execute('''
+                    DELETE FROM letters WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY gestora, title
+                                ORDER BY COALESCE(content, '') != '' DESC, LENGTH(content) DESC, id
+                            ) AS copy
+                            FROM letters
+                            WHERE gestora IS NOT NULL AND title IS NOT NULL
+                        )
+                        WHERE copy > 1
+                    )
+                ''')
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_letters_gestora_title ON letters (gestora, title)')
+
+            # discovery progress of paginated scrapers, so long backfills can resume
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    gestora TEXT PRIMARY KEY,
+                    last_page INTEGER,
+                    last_url TEXT,
+                    complete INTEGER DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            self.conn.commit()
+
     def exists(self, gestora: str, title: str) -> tuple:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT id, content FROM letters WHERE gestora = ? AND title = ?', (gestora, title))
-        
-        data = cursor.fetchone()
-        
-        if data is None:
-            return (False, None, None)
-        else:
-            id = data[0]
-            content = data[1]
-            return (True, id, content)
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT id, content FROM letters WHERE gestora = ? AND title = ?', (gestora, title))
+            
+            data = cursor.fetchone()
+            
+            if data is None:
+                return (False, None, None)
+            else:
+                id = data[0]
+                content = data[1]
+                return (True, id, content)
+
+    def known_titles(self, gestora: str) -> set:
+        """Titles of every letter from `gestora` whose content is already stored, in one query."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT title FROM letters WHERE gestora = ? AND content IS NOT NULL AND content <> ''", (gestora,))
+
+            return {row[0] for row in cursor.fetchall()}
 
     def store(self, letter) -> None:
-        exists, id, content = self.exists(letter['gestora'], letter['title'])
-        
-        if not exists:
-            # letter doesn't exist, insert new record
+        self.store_many([letter])
+
+    def store_many(self, letters) -> None:
+        rows = [
+            (letter['gestora'], letter['title'], letter['date'], letter['url'], letter['content'])
+            for letter in letters
+        ]
+
+        if not rows:
+            return
+
+        with self.lock:
             cursor = self.conn.cursor()
-            
-            cursor.execute('''
+
+            # insert new letters, and only fill in content for letters stored empty
+            cursor.executemany('''
                 INSERT INTO letters (gestora, title, date, url, content)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (letter['gestora'], letter['title'], letter['date'], letter['url'], letter['content']))
-            
-            self.conn.commit()
+                ON CONFLICT(gestora, title) DO UPDATE SET content = excluded.content
+                WHERE letters.content = ''
+            ''', rows)
+
+            self.conn.commit() # one transaction per batch
 
-        if exists and content == '':
-            # letter exists but has empty content, update it
+    def checkpoint(self, gestora: str) -> Optional[dict]:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT last_page, last_url, complete FROM checkpoints WHERE gestora = ?', (gestora,))
+
+            data = cursor.fetchone()
+
+        if data is None:
+            return None
+
+        return {"last_page": data[0], "last_url": data[1], "complete": bool(data[2])}
+
+    def save_checkpoint(self, gestora: str, last_page: int, last_url: str, complete: bool = False) -> None:
+        with self.lock:
             cursor = self.conn.cursor()
-            
             cursor.execute('''
-                UPDATE letters SET content = ? WHERE id = ?
-            ''', (letter['content'], id))
-            
-            self.conn.commit()
+                INSERT INTO checkpoints (gestora, last_page, last_url, complete, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(gestora) DO UPDATE SET
+                    last_page = excluded.last_page,
+                    last_url = excluded.last_url,
+                    complete = excluded.complete,
+                    updated_at = excluded.updated_at
+            ''', (gestora, last_page, last_url, int(complete)))
 
-        return
+            self.conn.commit()
 
     def clean_data(self, gestora: str) -> None:
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM letters WHERE gestora = ?', (gestora,))
-        
-        self.conn.commit()
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM letters WHERE gestora = ?', (gestora,))
+            cursor.execute('DELETE FROM checkpoints WHERE gestora = ?', (gestora,))
+            
+            self.conn.commit()
 
     def count_all_letters(self) -> int:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM letters')
-        return cursor.fetchone()[0]
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM letters')
+            return cursor.fetchone()[0]
 
 
 class DummyPipeline(DatabasePipeline):
     
     def exists(self, gestora, title) -> tuple:
-        return (False, None, None)
\ No newline at end of file
+        return (False, None, None)
+
+    def known_titles(self, gestora) -> set:
+        return set()
+
+    def checkpoint(self, gestora) -> None:
+        return None
+
+    def save_checkpoint(self, gestora, last_page, last_url, complete=False) -> None:
+        return
\ No newline at end of file
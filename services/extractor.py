@@ -1,7 +1,16 @@
 import io
+import os
 import requests
 import pypdf
-from typing import Optional
+import threading
+import multiprocessing
+from collections import deque
+from requests.adapters import HTTPAdapter
+from typing import Iterable, Iterator, Optional
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from services.cache import http_cache
+from services.throttle import host_throttle
 
 
 HEADERS = {
@@ -9,35 +18,69 @@ HEADERS = {
     "Accept": "application/pdf,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
 }
 
+POOL_SIZE = 16
+PARSE_WORKERS = os.cpu_count() or 1
+
+# one keep-alive pool shared by every PDFTextService instance
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+session.mount("http://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+
+
+def read_pdf(content: bytes) -> str:
+    pdf_bytes = io.BytesIO(content)
+    reader = pypdf.PdfReader(pdf_bytes)
+
+    extracted_text = ""
+
+    for page in reader.pages:
+        page_text = page.extract_text()
+
+        if page_text:
+            extracted_text += page_text
+
+    return extracted_text
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+def parse_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every caller that extracts PDF text off the GIL."""
+    global _parse_pool
+
+    # scrapers call this concurrently from worker threads, only one of them may create the pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn, not fork: scrapers call this from worker threads
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        return _parse_pool
+
+
 class PDFTextService:
     def __init__(self, timeout: int = 10):
         self.timeout = timeout
 
-    def extract_text(self, pdf_url: str, verify: bool = True, verbose: bool = True) -> Optional[str]:
-        try:
-            response = requests.get(
+    def download(self, pdf_url: str, verify: bool = True) -> bytes:
+        with host_throttle.slot(pdf_url):
+            return http_cache.get(
+                session,
                 pdf_url,
                 allow_redirects=True,
-                stream=True,
                 timeout=self.timeout,
-                headers=HEADERS,
                 verify=verify
             )
 
-            response.raise_for_status()
-
-            pdf_bytes = io.BytesIO(response.content)
-            reader = pypdf.PdfReader(pdf_bytes)
-
-            extracted_text = ""
-
-            for page in reader.pages:
-                page_text = page.extract_text()
-
-                if page_text:
-                    extracted_text += page_text
+    def extract_text(self, pdf_url: str, verify: bool = True, verbose: bool = True) -> Optional[str]:
+        try:
+            content = self.download(pdf_url, verify=verify)
 
-            return extracted_text
+            return read_pdf(content)
 
         except Exception as e:
             if verbose:
@@ -45,6 +88,56 @@ class PDFTextService:
             
             return None
 
+    def _download_and_submit(self, pdf_url: str, verify: bool) -> Future:
+        # runs on a download thread and hands the bytes straight to a parser process
+        return parse_pool().submit(read_pdf, self.download(pdf_url, verify=verify))
+
+    def extract_many(self, pdf_urls: Iterable[str], verify: bool = True, verbose: bool = True, window: Optional[int] = None) -> Iterator[Optional[str]]:
+        """
+        Yields the text of each PDF in the order of pdf_urls (None on failure).
+
+        Downloads run on a thread pool and feed pypdf workers in a process pool, so
+        parsing of one PDF overlaps the download of the next. At most `window` PDFs
+        are in flight at once, which bounds memory on large backfills.
+        """
+        window = window or 2 * PARSE_WORKERS
+        pdf_urls = iter(pdf_urls)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=min(window, POOL_SIZE)) as downloads:
+            def refill():
+                while len(pending) < window:
+                    pdf_url = next(pdf_urls, None)
+
+                    if pdf_url is None:
+                        return
+
+                    pending.append((pdf_url, downloads.submit(self._download_and_submit, pdf_url, verify)))
+
+            refill()
+
+            try:
+                while pending:
+                    pdf_url, download = pending.popleft()
+
+                    try:
+                        text = download.result().result()
+
+                    except Exception as e:
+                        if verbose:
+                            print(f"Failed to extract text from PDF at {pdf_url}: {str(e)}")
+
+                        text = None
+
+                    refill()
+
+                    yield text
+
+            finally:
+                # the caller may stop early (limit), drop what has not started yet
+                for _, download in pending:
+                    download.cancel()
+
 
 if __name__ == "__main__":
     service = PDFTextService()
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+from urllib.parse import urlparse
+
+
+class HostThrottle:
+    """Caps how many requests may be in flight against the same host at once."""
+
+    def __init__(self, per_host: int = 2) -> None:
+        self.per_host = per_host
+
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+
+    def configure(self, per_host: int) -> None:
+        with self._lock:
+            self.per_host = per_host
+            self._slots.clear()
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+
+            return self._slots[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        semaphore = self._semaphore(urlparse(url).netloc)
+
+        with semaphore:
+            yield
+
+    @asynccontextmanager
+    async def aslot(self, url: str, poll: float = 0.05):
+        """Same slots as `slot`, waited for without blocking the event loop (and safe to cancel)."""
+        semaphore = self._semaphore(urlparse(url).netloc)
+
+        while not semaphore.acquire(blocking=False):
+            await asyncio.sleep(poll)
+
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+# shared by every scraper and the PDF service so the cap holds across threads
+host_throttle = HostThrottle()
@@ -0,0 +1,91 @@
+import re
+import time
+import sqlite3
+import argparse
+from typing import Callable, List
+
+from chunking import sentence_chunks
+
+# previous implementation, kept as the reference the engine must reproduce
+legacy_split_pattern = re.compile(r'(?<=[.!?])(?:["”’\)\]]+)?\s+')
+legacy_token_pattern = re.compile(r'\S+')
+
+def legacy_sanitize_text(text: str) -> str:
+    substitutions = {
+        "Œ": "ê",
+        "ªo": "ão",
+        "Æ": "á",
+        "Ø": "é",
+        "ª": "ã",
+    }
+
+    for k, v in substitutions.items():
+        text = text.replace(k, v)
+
+    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+
+    text = text.replace("\n", " ")
+    text = " ".join(text.split())
+
+    return text.strip()
+
+def legacy_sentence_chunks(text: str, min_tokens: int = 20, max_tokens: int = 500, non_letter_threshold: float = 0.05) -> List[str]:
+    chunks = []
+
+    for sentence in legacy_split_pattern.split(text):
+        sentence = legacy_sanitize_text(sentence)
+
+        if not sentence:
+            continue
+
+        non_letter = sum(1 for c in sentence if not c.isalpha() and not c.isspace())
+
+        if (non_letter / len(sentence)) > non_letter_threshold:
+            continue
+
+        token_count = len(legacy_token_pattern.findall(sentence))
+
+        if min_tokens <= token_count <= max_tokens:
+            chunks.append(sentence)
+
+    return chunks
+
+def measure(fn: Callable[[str], List[str]], texts: List[str], repeat: int) -> float:
+    """Best chars/sec over `repeat` passes on the whole corpus."""
+    chars = sum(len(text) for text in texts)
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+
+        for text in texts:
+            fn(text)
+
+        best = min(best, time.perf_counter() - start)
+
+    return chars / best
+
+def run(db_path: str = "letters.db", repeat: int = 3) -> None:
+    conn = sqlite3.connect(db_path)
+    texts = [row[0] for row in conn.execute("SELECT content FROM letters WHERE content IS NOT NULL AND content <> ''")]
+    conn.close()
+
+    mismatches = sum(legacy_sentence_chunks(text) != sentence_chunks(text) for text in texts)
+
+    legacy = measure(legacy_sentence_chunks, texts, repeat)
+    engine = measure(sentence_chunks, texts, repeat)
+
+    print(f"Letters: {len(texts)}, characters: {sum(len(text) for text in texts):,}")
+    print(f"Legacy: {legacy / 1e6:.2f} M chars/sec")
+    print(f"Engine: {engine / 1e6:.2f} M chars/sec ({engine / legacy:.2f}x)")
+    print(f"Letters with different chunks: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark sentence chunking on the letters corpus')
+    parser.add_argument('--db', default="letters.db", help='SQLite database with the scraped letters')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus, the fastest one is reported')
+    args = parser.parse_args()
+
+    run(args.db, args.repeat)
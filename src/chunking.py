@@ -0,0 +1,64 @@
+import re
+from typing import Iterator, List
+
+# accents broken by the PDF text extraction; "ªo" must be replaced before a lone "ª"
+substitutions = (
+    ("Œ", "ê"),
+    ("ªo", "ão"),
+    ("Æ", "á"),
+    ("Ø", "é"),
+    ("ª", "ã"),
+)
+
+hyphen_pattern = re.compile(r'\b(\w+)-\n(\w+)') # \b: no retries from inside a word
+
+# sanitized text only has single spaces, so a boundary is punctuation, closing quotes and one space
+split_pattern = re.compile(r'(?<=[.!?])["”’\)\]]* ')
+
+def sanitize_text(text: str) -> str:
+    for k, v in substitutions:
+        text = text.replace(k, v)
+
+    # remover separações hifenizadas entre linhas
+    if "-\n" in text:
+        text = hyphen_pattern.sub(r'\1\2', text)
+
+    # quebras de linha e espaços repetidos viram um único espaço
+    return " ".join(text.split())
+
+def iter_chunks(text: str, min_tokens: int = 20, max_tokens: int = 500, non_letter_threshold: float = 0.05) -> Iterator[str]:
+    """
+    Sanitizes the whole letter once, then splits it into sentences and keeps the
+    ones with `min_tokens` to `max_tokens` tokens and at most `non_letter_threshold`
+    of characters that are neither letters nor spaces.
+    """
+    sanitized = sanitize_text(text)
+
+    # a boundary at the very end also swallows closing quotes when the letter ends in whitespace
+    if text[-1:].isspace():
+        sanitized += " "
+
+    sentences = split_pattern.split(sanitized)
+    sentences[-1] = sentences[-1].rstrip(" ")
+
+    for sentence in sentences:
+        if not sentence:
+            continue
+
+        # words are separated by exactly one space
+        spaces = sentence.count(" ")
+
+        if not min_tokens <= spaces + 1 <= max_tokens:
+            continue
+
+        non_letter = len(sentence) - spaces - sum(map(str.isalpha, sentence))
+
+        if non_letter / len(sentence) <= non_letter_threshold:
+            yield sentence
+
+def sentence_chunks(text: str, min_tokens: int = 20, max_tokens: int = 500, non_letter_threshold: float = 0.05) -> List[str]:
+    return list(iter_chunks(text, min_tokens, max_tokens, non_letter_threshold))
+
+def batch_chunks(texts: List[str], min_tokens: int = 20, max_tokens: int = 500, non_letter_threshold: float = 0.05) -> List[str]:
+    """Chunks of several letters, flattened; one process pool task per batch keeps IPC overhead low."""
+    return [chunk for text in texts for chunk in iter_chunks(text, min_tokens, max_tokens, non_letter_threshold)]
@@ -0,0 +1,79 @@
+import torch
+import argparse
+from pathlib import Path
+
+EXPORT_FORMATS = {"torchscript": "model.pt", "onnx": "model.onnx"}
+
+
+def export_dir(model_dir: str, fmt: str) -> Path:
+    """Where an exported graph of a merged classifier is written, next to the checkpoint."""
+    return Path(f"{Path(model_dir)}-{fmt}")
+
+class LogitsOnly(torch.nn.Module):
+    """Plain (input_ids, attention_mask) -> logits signature, which both exporters can trace."""
+
+    def __init__(self, model) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+def export_model(model_dir: str, fmt: str = "torchscript", output_dir: str | None = None, opset: int = 17) -> Path:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {list(EXPORT_FORMATS)}")
+
+    output_dir = Path(output_dir) if output_dir else export_dir(model_dir, fmt)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # imported here so the inference backends can read EXPORT_FORMATS without the modeling code
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model     = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, do_lower_case=False)
+
+    # two rows of different length, so padding is part of the traced graph
+    example = tokenizer(
+        ["O fundo encerrou o ano com retorno positivo.", "A carteira segue concentrada em empresas com bons fundamentos e baixo endividamento."],
+        padding=True,
+        return_tensors="pt",
+    )
+    inputs = (example["input_ids"], example["attention_mask"])
+    wrapper = LogitsOnly(model).eval()
+
+    with torch.inference_mode():
+        if fmt == "torchscript":
+            torch.jit.trace(wrapper, inputs).save(str(output_dir / EXPORT_FORMATS[fmt]))
+
+        else:
+            torch.onnx.export(
+                wrapper,
+                inputs,
+                str(output_dir / EXPORT_FORMATS[fmt]),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=opset,
+                dynamo=False,
+            )
+
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    print(f"✔  {fmt} graph written to: {output_dir.resolve()}")
+
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the merged classifier for the inference backends')
+    parser.add_argument('--model-dir', default="models/sentiment-bert-portuguese-asset-management-cls", help='Merged fp32 classifier')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default="torchscript")
+    parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+    args = parser.parse_args()
+
+    export_model(args.model_dir, fmt=args.format, opset=args.opset)
@@ -1,79 +1,306 @@
-import re
+import json
+import random
+import hashlib
 import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
-from datasets import Dataset
 
 from transformers import (
     AutoModelForSequenceClassification,
     AutoTokenizer,
     BertForSequenceClassification,
-    pipeline,
 )
 
-split_pattern = re.compile(r'(?<=[.!?])(?:["”’\)\]]+)?\s+')
-token_pattern = re.compile(r'\S+')
+from chunking import sentence_chunks
 
-def sanitize_text(text: str) -> str:
+# INFERENCE
 
-    substitutions = {
-        "Œ": "ê",
-        "ªo": "ão",
-        "Æ": "á",
-        "Ø": "é",
-        "ª": "ã",
-    }
+DB_PATH            = "letters.db"
+CUSTOM_MODEL_DIR   = "models/sentiment-bert-portuguese-asset-management-cls"
+BENCHMARK_MODEL_ID = "lucas-leme/FinBERT-PT-BR"
+DEVICE             = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+BATCH_SIZE         = 64
+TOKEN_BUDGET       = BATCH_SIZE * 256  # padded tokens per batch: rows x longest row
+LETTERS_PER_STEP   = 32   # letters whose chunks share one queue of full batches
+BENCHMARK_SAMPLE   = 1.0  # fraction of letters also scored by the benchmark model
 
-    for k, v in substitutions.items():
-        text = text.replace(k, v)
+def token_budget_batches(lengths: List[int], budget: int = TOKEN_BUDGET) -> List[List[int]]:
+    """
+    Groups indices into batches of similar length whose padded size (rows times
+    the longest row) stays within `budget`. Short sentences then share large
+    batches instead of being padded to the longest chunk of an arbitrary batch.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches, batch = [], []
 
-    # remover separações hifenizadas entre linhas
-    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+    for idx in order:
+        # sorted ascending, so the newest member is always the longest one
+        if batch and lengths[idx] * (len(batch) + 1) > budget:
+            batches.append(batch)
+            batch = []
 
-    # remover quebras de linha no meio de frases
-    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+        batch.append(idx)
 
-    text = text.replace("\n", " ")
-    text = " ".join(text.split())
+    if batch:
+        batches.append(batch)
 
-    text = text.strip()
-    
-    return text
+    return batches
 
-def sentence_chunks(text: str, min_tokens: int = 20, max_tokens: int = 500, non_letter_threshold: float = 0.05,) -> List[str]:
-    chunks = []
-    
-    for sentence in split_pattern.split(text):
-        sentence = sanitize_text(sentence)
-        
-        if not sentence:
-            continue
-        
-        non_letter = sum(
-            1 for c in sentence if not c.isalpha() and not c.isspace()
-        )
-        
-        if (non_letter / len(sentence)) > non_letter_threshold:
-            continue
-        
-        token_count = len(token_pattern.findall(sentence))
-        
-        if min_tokens <= token_count <= max_tokens:
-            chunks.append(sentence)
-    
-    return chunks
+def aggregate_scores(probs: np.ndarray, offsets: np.ndarray, pos: int, neg: int, alpha: float = 0.75) -> np.ndarray:
+    """
+    Letter scores in [0, 100] from an (n_chunks, n_labels) probability matrix, where
+    letter k owns rows offsets[k]:offsets[k + 1]. Each chunk contributes its
+    normalized polarity weighted by how non-neutral it is, and the weighted mean is
+    sharpened by `alpha`. Letters without chunks (or weight) score 50.
+    """
+    p_pos = probs[:, pos].astype(np.float64)
+    p_neg = probs[:, neg].astype(np.float64)
 
-# INFERENCE
+    weights = p_pos + p_neg
+    polarity = np.divide(p_pos - p_neg, weights, out=p_pos - p_neg, where=weights > 0)
 
-DB_PATH            = "letters.db"
-CUSTOM_MODEL_DIR   = "models/sentiment-bert-portuguese-asset-management-cls"
-BENCHMARK_MODEL_ID = "lucas-leme/FinBERT-PT-BR"
-DEVICE             = 0 if torch.cuda.is_available() else -1
-BATCH_SIZE         = 64
+    starts, ends = np.asarray(offsets[:-1]), np.asarray(offsets[1:])
+    scores = np.full(len(starts), 50, dtype=np.int64)
+    filled = ends > starts
+
+    if not filled.any():
+        return scores
+
+    # empty segments are dropped, so each remaining start runs up to the next one
+    num = np.add.reduceat(polarity * weights, starts[filled])
+    den = np.add.reduceat(weights, starts[filled])
+
+    S = np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+    S = np.sign(S) * np.abs(S) ** alpha
+
+    scores[filled] = np.where(den > 0, (50 * (S + 1)).astype(np.int64), 50) # [-1,1] -> [0,100]
+
+    return scores
+
+def directory_fingerprint(path: Path, revision: Optional[str] = None) -> str:
+    """Names the weights a score came from: checkpoint name plus a digest of its files."""
+    digest = hashlib.sha1()
+
+    if path.is_dir():
+        for file in sorted(path.iterdir()):
+            if file.is_file():
+                stat = file.stat()
+                digest.update(f"{file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    else:
+        digest.update(str(revision).encode())
+
+    return f"{path.name}@{digest.hexdigest()[:12]}"
+
+def model_fingerprint(model) -> str:
+    return directory_fingerprint(Path(model.config._name_or_path), getattr(model.config, "_commit_hash", None))
+
+class LogitsScorer:
+    """
+    A tokenizer and a sequence classifier called directly under `torch.inference_mode`,
+    without `transformers.pipeline` and its per-item label dicts. Probabilities come
+    back as one (n, num_labels) float32 tensor whose columns follow `config.id2label`.
+    """
+
+    def __init__(self, model, tokenizer, id2label: Optional[Dict[int, str]] = None, device: torch.device = DEVICE) -> None:
+        if id2label is not None:
+            model.config.id2label = id2label
+            model.config.label2id = {v: k for k, v in id2label.items()}
+
+        self.model = model.to(device).eval()
+        self.tokenizer = tokenizer
+        self.device = device
+        self.model_id = model_fingerprint(model)
+
+        self.id2label = dict(model.config.id2label)
+        self.label2id = dict(model.config.label2id)
+        self.num_labels = model.config.num_labels
+
+    def encode(self, sentences: List[str]) -> List[List[int]]:
+        return self.tokenizer(sentences, truncation=True, max_length=512)["input_ids"] if sentences else []
+
+    def probs(self, input_ids: List[List[int]]) -> torch.Tensor:
+        """Class probabilities for already tokenized chunks, batched by length under the token budget."""
+        probs = torch.zeros((len(input_ids), self.num_labels), dtype=torch.float32)
+
+        with torch.inference_mode():
+            for batch in token_budget_batches([len(ids) for ids in input_ids]):
+                batch_ids, attention_mask = self._pad([input_ids[i] for i in batch])
+                logits = self._logits(batch_ids.to(self.device), attention_mask.to(self.device))
+
+                probs[batch] = torch.softmax(logits.float(), dim=-1).cpu()
+
+        return probs
+
+    def _pad(self, input_ids: List[List[int]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        inputs = self.tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
+        return inputs["input_ids"], inputs["attention_mask"]
+
+    def _logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    def __call__(self, sentences: List[str]) -> torch.Tensor:
+        return self.probs(self.encode(sentences))
+
+    def letter_scores(self, probs: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        return aggregate_scores(probs, offsets, self.label2id["POSITIVE"], self.label2id["NEGATIVE"])
+
+class ExportedScorer(LogitsScorer):
+    """
+    Runs a graph written by `export.py` instead of a transformers model: a TorchScript
+    module, or an ONNX graph through onnxruntime. Nothing is built from the modeling
+    code: tokenizer.json is read with the `tokenizers` library and config.json as JSON.
+    """
+
+    def __init__(self, path: Path, backend: str, id2label: Optional[Dict[int, str]] = None, num_threads: Optional[int] = None) -> None:
+        from tokenizers import Tokenizer
+        from export import EXPORT_FORMATS
+
+        config = json.loads((path / "config.json").read_text())
+
+        self.id2label = id2label or {int(k): v for k, v in config["id2label"].items()}
+        self.label2id = {v: k for k, v in self.id2label.items()}
+        self.num_labels = len(self.id2label)
+
+        self.tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(512)
+        self.tokenizer.no_padding()
+
+        self.pad_token_id = config.get("pad_token_id") or 0
+        self.device = torch.device("cpu")
+        self.model_id = directory_fingerprint(path)
+        self.backend = backend
+
+        if backend == "onnx":
+            try:
+                import onnxruntime as ort
+            except ImportError as e:
+                raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime") from e
+
+            options = ort.SessionOptions()
+
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+
+            self.session = ort.InferenceSession(str(path / EXPORT_FORMATS[backend]), options, providers=["CPUExecutionProvider"])
+
+        else:
+            self.module = torch.jit.load(str(path / EXPORT_FORMATS[backend]), map_location="cpu").eval()
+
+    def encode(self, sentences: List[str]) -> List[List[int]]:
+        return [encoding.ids for encoding in self.tokenizer.encode_batch(sentences)] if sentences else []
+
+    def _pad(self, input_ids: List[List[int]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        length = max(map(len, input_ids))
+
+        padded = torch.full((len(input_ids), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(input_ids), length), dtype=torch.long)
+
+        for row, ids in enumerate(input_ids):
+            padded[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+
+        return padded, attention_mask
+
+    def _logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        if self.backend == "onnx":
+            (logits,) = self.session.run(["logits"], {"input_ids": input_ids.numpy(), "attention_mask": attention_mask.numpy()})
+            return torch.from_numpy(logits)
+
+        return self.module(input_ids, attention_mask)
+
+class AdapterScorer(LogitsScorer):
+    """
+    One LoRA adapter of a PeftModel that holds several adapters over a single base
+    encoder. Scoring switches the model to this adapter with `set_adapter`, so each
+    extra variant costs its adapter weights instead of a merged copy of the model.
+    """
+
+    def __init__(self, peft_model, name: str, adapter_dir: str, tokenizer, id2label: Optional[Dict[int, str]] = None, device: torch.device = DEVICE) -> None:
+        super().__init__(peft_model, tokenizer, id2label=id2label, device=device)
+
+        self.name = name
+        self.model_id = directory_fingerprint(Path(adapter_dir))
+
+    def _logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        self.model.set_adapter(self.name)
+        return super()._logits(input_ids, attention_mask)
+
+def load_adapters(adapters: Dict[str, str], id2label: Dict[int, str]) -> Dict[str, AdapterScorer]:
+    """Loads the base encoder named by the first adapter once, then every adapter on top of it."""
+    from peft import PeftConfig, PeftModel # only needed when serving unmerged adapters
+
+    names = list(adapters)
+    base_dir = PeftConfig.from_pretrained(adapters[names[0]]).base_model_name_or_path
+
+    tokenizer = AutoTokenizer.from_pretrained(base_dir, do_lower_case=False)
+    base_model = AutoModelForSequenceClassification.from_pretrained(base_dir, num_labels=len(id2label))
+
+    model = PeftModel.from_pretrained(base_model, adapters[names[0]], adapter_name=names[0])
+
+    for name in names[1:]:
+        model.load_adapter(adapters[name], adapter_name=name)
+
+    return {name: AdapterScorer(model, name, adapters[name], tokenizer, id2label=id2label) for name in names}
+
+class SentenceCache:
+    """
+    Persistent class probabilities per (model, sanitized sentence). Letters repeat
+    disclaimers and fund descriptions, so most sentences were already scored by a
+    previous letter or run. `hits` and `misses` count unique sentence lookups.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sentence_cache (key TEXT PRIMARY KEY, probs BLOB)")
+        self.conn.commit()
+
+        self.hits, self.misses = 0, 0
+
+    @staticmethod
+    def key(model_id: str, sentence: str) -> str:
+        return hashlib.sha1(f"{model_id}\0{sentence}".encode("utf-8")).hexdigest()
+
+    def get(self, model_id: str, sentences: List[str], num_labels: int) -> Tuple[np.ndarray, List[int]]:
+        """Cached probabilities for `sentences`, and the indices of the ones not cached (left as zeros)."""
+        keys = [self.key(model_id, sentence) for sentence in sentences]
+        found = {}
+
+        for start in range(0, len(keys), 500): # stay under SQLite's bound parameter limit
+            part = keys[start:start + 500]
+            found.update(self.conn.execute(
+                f"SELECT key, probs FROM sentence_cache WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+
+        probs = np.zeros((len(sentences), num_labels), dtype=np.float32)
+        missing = []
+
+        for i, key in enumerate(keys):
+            if key in found:
+                probs[i] = np.frombuffer(found[key], dtype=np.float32)
+            else:
+                missing.append(i)
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        return probs, missing
+
+    def put(self, model_id: str, sentences: List[str], probs: np.ndarray) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO sentence_cache (key, probs) VALUES (?, ?)",
+            [(self.key(model_id, sentence), row.astype(np.float32).tobytes()) for sentence, row in zip(sentences, probs)],
+        )
+        self.conn.commit()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
 
 class SentimentAnalysis:
     def __init__(
@@ -81,38 +308,92 @@ class SentimentAnalysis:
         db_path: str = DB_PATH,
         custom_model_dir: str = CUSTOM_MODEL_DIR,
         benchmark_model_name: str = BENCHMARK_MODEL_ID,
+        benchmark_sample: float = BENCHMARK_SAMPLE,
+        parallel: bool = False,
+        sentence_cache: bool = True,
+        quantized: bool = False,
+        backend: str = "torch",
+        num_threads: Optional[int] = None,
+        adapters: Optional[Dict[str, str]] = None,
     ):
+        """
+        :param benchmark_sample: Fraction of letters also scored by the benchmark model (0 skips loading it).
+        :param parallel: Run both models at the same time; without num_threads each one gets half of the CPU threads.
+        :param sentence_cache: Reuse probabilities of sentences already scored, stored next to the letters.
+        :param quantized: Score with the INT8 variant of the custom model written by `quantize.py` (CPU only).
+        :param backend: "torch", or "torchscript" / "onnx" to run the custom model graph written by `export.py`.
+        :param num_threads: CPU threads for torch and onnxruntime (default: their own choice).
+        :param adapters: Unmerged LoRA adapters as {name: adapter_dir}, served over one shared base encoder.
+            The first one replaces the merged custom model, each other one is scored into `sentiment_<name>`.
+        """
         self.db_path = Path(db_path)
+        self.benchmark_sample = benchmark_sample
+        self.parallel = parallel
 
-        self.tokenizer_custom = AutoTokenizer.from_pretrained(custom_model_dir, do_lower_case=False)
-        self.model_custom     = AutoModelForSequenceClassification.from_pretrained(custom_model_dir)
-        
-        self.model_custom.config.id2label = {0: "NEGATIVE", 1: "POSITIVE", 2: "NEUTRAL"}
-        self.model_custom.config.label2id = {v: k for k, v in self.model_custom.config.id2label.items()}
-        
-        self.pipeline_custom  = pipeline(
-            "text-classification",
-            model=self.model_custom,
-            tokenizer=self.tokenizer_custom,
-            top_k=None,
-            device=DEVICE,
-        )
+        # the intra-op thread count is process-wide, so it is set once here and never from the scoring threads
+        if num_threads:
+            torch.set_num_threads(num_threads)
 
-        self.tokenizer_bench = AutoTokenizer.from_pretrained(benchmark_model_name, do_lower_case=False)
-        self.model_bench = BertForSequenceClassification.from_pretrained(benchmark_model_name)
-        
-        self.model_bench.config.id2label = {0: "POSITIVE", 1: "NEGATIVE", 2: "NEUTRAL"}
-        self.model_bench.config.label2id = {"POSITIVE": 0, "NEGATIVE": 1, "NEUTRAL": 2}
-        
-        self.pipeline_bench = pipeline(
-            "text-classification",
-            model=self.model_bench,
-            tokenizer=self.tokenizer_bench,
-            top_k=None,
-            device=DEVICE,
+        elif parallel:
+            torch.set_num_threads(max(1, torch.get_num_threads() // 2))
+
+        custom_labels = {0: "NEGATIVE", 1: "POSITIVE", 2: "NEUTRAL"}
+        self.extra = {}
+
+        if adapters:
+            if backend != "torch" or quantized:
+                raise ValueError("Unmerged adapters are only served by the plain torch backend")
+
+            for name in adapters:
+                if not name.isidentifier():
+                    raise ValueError(f"Adapter name '{name}' is not usable as a column suffix")
+
+            scorers = load_adapters(adapters, custom_labels)
+            primary, *others = scorers
+
+            self.custom = scorers[primary]
+            self.extra = {name: scorers[name] for name in others}
+
+        elif backend == "torch":
+            if quantized:
+                from quantize import load_quantized, quantized_dir # keeps sklearn off plain scoring runs
+
+                custom_model = load_quantized(quantized_dir(custom_model_dir))
+            else:
+                custom_model = AutoModelForSequenceClassification.from_pretrained(custom_model_dir)
+
+            self.custom = LogitsScorer(
+                custom_model,
+                AutoTokenizer.from_pretrained(custom_model_dir, do_lower_case=False),
+                id2label=custom_labels,
+                device=torch.device("cpu") if quantized else DEVICE,
+            )
+
+        else:
+            from export import EXPORT_FORMATS, export_dir
+
+            if backend not in EXPORT_FORMATS:
+                raise ValueError(f"Unknown backend '{backend}', expected 'torch' or one of {list(EXPORT_FORMATS)}")
+
+            self.custom = ExportedScorer(export_dir(custom_model_dir, backend), backend, id2label=custom_labels, num_threads=num_threads)
+
+        self.bench = None
+
+        if benchmark_sample > 0:
+            self.bench = LogitsScorer(
+                BertForSequenceClassification.from_pretrained(benchmark_model_name),
+                AutoTokenizer.from_pretrained(benchmark_model_name, do_lower_case=False),
+                id2label={0: "POSITIVE", 1: "NEGATIVE", 2: "NEUTRAL"},
+            )
+
+        # both checkpoints descend from BERTimbau, so chunks are usually tokenized once for both
+        self.shared_tokenizer = (
+            self.bench is None
+            or self.bench.tokenizer.get_vocab() == self.custom.tokenizer.get_vocab()
         )
 
         self._ensure_columns()
+        self.cache = SentenceCache(self.db_path) if sentence_cache else None
 
     @contextmanager
     def _db_connection(self):
@@ -137,65 +418,226 @@ class SentimentAnalysis:
 
     def _ensure_columns(self):
         cols = [row[1] for row in self._execute("PRAGMA table_info(letters)", fetch=True)]
-        for col in ("sentiment", "sentiment_benchmark"):
+        for col in ("sentiment", "sentiment_benchmark", *self._extra_columns()):
             if col not in cols:
                 self._execute(f"ALTER TABLE letters ADD COLUMN {col} INTEGER")
-
-    @staticmethod
-    def _aggregate(prob_chunks: List[List[Dict[str, float]]]) -> int:
-        if not prob_chunks:
-            return 50
-        
-        scores, weights = [], []
         
-        for chunk in prob_chunks:
-            d = {x["label"]: x["score"] for x in chunk}
-            p_pos, p_neg = d["POSITIVE"], d["NEGATIVE"]
-            
-            s_i = p_pos - p_neg
-            w_i = p_pos + p_neg
-            
-            if w_i:
-                p_pos, p_neg = p_pos / w_i, p_neg / w_i
-                s_i = p_pos - p_neg
-            
-            scores.append(s_i)
-            
-            weights.append(w_i)
+        # what the stored sentiment was computed from, so unchanged letters are not rescored
+        for col in ("content_hash", "sentiment_model", "sentiment_benchmark_model", *(f"{col}_model" for col in self._extra_columns())):
+            if col not in cols:
+                self._execute(f"ALTER TABLE letters ADD COLUMN {col} TEXT")
 
-        S = np.dot(scores, weights) / sum(weights) if weights else 0.0
-        S = np.sign(S) * abs(S) ** 0.75            # alpha = 0.75
-        
-        return int(50 * (S + 1))                   # [-1,1] -> [0,100]
+    def _extra_columns(self) -> List[str]:
+        return [f"sentiment_{name}" for name in self.extra]
+
+    def _use_benchmark(self, letter_id: int) -> bool:
+        if self.bench is None:
+            return False
 
-    def _predict_pair(self, chunks: List[str]) -> Tuple[int, int]:
-        if not chunks:
-            return 50, 50
+        # seeded by id, so the sampled subset is the same on every run
+        return random.Random(letter_id).random() < self.benchmark_sample
 
-        pipe_kwargs = dict(batch_size=BATCH_SIZE, truncation=True, max_length=512)
+    def _predict_many(self, letters_chunks: List[List[str]], benchmark: Optional[List[bool]] = None) -> List[Tuple[int, Optional[int]]]:
+        """
+        Scores several letters at once. Their chunks are flattened into a single
+        queue, so batches stay full no matter how short each letter is, and the
+        probabilities are aggregated per letter with `aggregate_scores`.
 
-        p_custom = self.pipeline_custom(chunks, **pipe_kwargs)
-        p_bench  = self.pipeline_bench (chunks, **pipe_kwargs)
+        Repeated sentences are scored once, and sentences found in the sentence
+        cache are not scored at all. The remaining ones are tokenized once and
+        the encodings are reused by the benchmark model when both tokenizers
+        share a vocabulary. Letters whose `benchmark` flag is off get None as
+        benchmark score.
+        """
+        if benchmark is None:
+            benchmark = [self.bench is not None] * len(letters_chunks)
 
-        return self._aggregate(p_custom), self._aggregate(p_bench)
+        offsets = np.cumsum([0] + [len(chunks) for chunks in letters_chunks])
+        flat = [chunk for chunks in letters_chunks for chunk in chunks]
 
-    def run(self, where: str = "gestora <> 'Encore' and content is not null and content <> ''"):
-        rows = self._execute(f"SELECT id, content FROM letters WHERE {where}", fetch=True)
+        # boilerplate repeats across letters, so work on unique sentences
+        unique = list(dict.fromkeys(flat))
+        position = {sentence: i for i, sentence in enumerate(unique)}
+        flat_pos = [position[sentence] for sentence in flat]
+
+        bench_unique = sorted({
+            flat_pos[i]
+            for chunks_start, chunks_end, use in zip(offsets[:-1], offsets[1:], benchmark) if use
+            for i in range(chunks_start, chunks_end)
+        })
+        bench_sentences = [unique[u] for u in bench_unique]
+
+        probs_custom, miss_custom = self._lookup(self.custom, unique)
+        probs_bench, miss_bench = self._lookup(self.bench, bench_sentences)
+
+        if self.shared_tokenizer:
+            # benchmark misses map back to unique sentences, so one encoding serves both models
+            to_encode = sorted(set(miss_custom) | {bench_unique[j] for j in miss_bench})
+            encoded = dict(zip(to_encode, self.custom.encode([unique[u] for u in to_encode])))
+
+            custom_ids = [encoded[u] for u in miss_custom]
+            bench_ids  = [encoded[bench_unique[j]] for j in miss_bench]
+
+        else:
+            custom_ids = self.custom.encode([unique[u] for u in miss_custom])
+            bench_ids  = self.bench.encode([bench_sentences[j] for j in miss_bench])
+
+        if self.parallel and custom_ids and bench_ids:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                custom = executor.submit(self.custom.probs, custom_ids)
+                bench  = executor.submit(self.bench.probs, bench_ids)
+
+                scored_custom, scored_bench = custom.result(), bench.result()
+
+        else:
+            scored_custom = self.custom.probs(custom_ids) if custom_ids else None
+            scored_bench  = self.bench.probs(bench_ids) if bench_ids else None
+
+        if custom_ids:
+            probs_custom[miss_custom] = scored_custom.numpy()
+            self._remember(self.custom, [unique[u] for u in miss_custom], probs_custom[miss_custom])
+
+        if bench_ids:
+            probs_bench[miss_bench] = scored_bench.numpy()
+            self._remember(self.bench, [bench_sentences[j] for j in miss_bench], probs_bench[miss_bench])
+
+        # one row per chunk; rows of letters outside the benchmark sample stay zero and are discarded
+        scores_custom = self.custom.letter_scores(probs_custom[flat_pos], offsets)
+        scores_bench  = [None] * len(letters_chunks)
+
+        if bench_unique:
+            bench_row = np.full(len(unique), -1)
+            bench_row[bench_unique] = np.arange(len(bench_unique))
+
+            rows = bench_row[flat_pos] if flat_pos else np.zeros(0, dtype=np.int64)
+            flat_bench = np.zeros((len(flat), probs_bench.shape[1]), dtype=np.float32)
+            flat_bench[rows >= 0] = probs_bench[rows[rows >= 0]]
+
+            scores_bench = self.bench.letter_scores(flat_bench, offsets)
+
+        return [
+            (int(s_custom), int(s_bench) if use else None)
+            for s_custom, s_bench, use in zip(scores_custom, scores_bench, benchmark)
+        ]
+
+    def _lookup(self, scorer: Optional[LogitsScorer], sentences: List[str]) -> Tuple[np.ndarray, List[int]]:
+        if scorer is None or not sentences:
+            return np.zeros((0, 3), dtype=np.float32), []
+
+        if self.cache is None:
+            return np.zeros((len(sentences), scorer.num_labels), dtype=np.float32), list(range(len(sentences)))
+
+        return self.cache.get(scorer.model_id, sentences, scorer.num_labels)
+
+    def _remember(self, scorer: LogitsScorer, sentences: List[str], probs: np.ndarray) -> None:
+        if self.cache is not None:
+            self.cache.put(scorer.model_id, sentences, probs)
+
+    def _predict_with(self, scorer: LogitsScorer, letters_chunks: List[List[str]]) -> List[int]:
+        """Letter scores from a single scorer, used for the adapters compared against the custom model."""
+        offsets = np.cumsum([0] + [len(chunks) for chunks in letters_chunks])
+        flat = [chunk for chunks in letters_chunks for chunk in chunks]
+
+        unique = list(dict.fromkeys(flat))
+        position = {sentence: i for i, sentence in enumerate(unique)}
+
+        probs, missing = self._lookup(scorer, unique)
+
+        if missing:
+            probs[missing] = scorer.probs(scorer.encode([unique[u] for u in missing])).numpy()
+            self._remember(scorer, [unique[u] for u in missing], probs[missing])
+
+        flat_probs = probs[[position[sentence] for sentence in flat]] if flat else np.zeros((0, scorer.num_labels), dtype=np.float32)
+
+        return [int(score) for score in scorer.letter_scores(flat_probs, offsets)]
+
+    def _predict_pair(self, chunks: List[str]) -> Tuple[int, Optional[int]]:
+        return self._predict_many([chunks])[0]
+
+    @staticmethod
+    def _content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def run(self, where: str = "gestora <> 'Encore' and content is not null and content <> ''", force: bool = False):
+        extra_columns = self._extra_columns()
+        extra_ids = [scorer.model_id for scorer in self.extra.values()]
+        bench_id = self.bench.model_id if self.bench is not None else None
+        rows = self._execute(
+            f"SELECT id, content, content_hash, sentiment_model, sentiment_benchmark_model{''.join(f', {col}_model' for col in extra_columns)} FROM letters WHERE {where}",
+            fetch=True,
+        )
+        
+        # only letters that are new, edited, or scored by another model or adapter revision;
+        # letters in the benchmark sample also need a score from the current benchmark model
+        rows = [
+            (letter_id, content, self._content_hash(content or ""))
+            for letter_id, content, content_hash, model_id, bench_model, *extra in rows
+            if force
+            or model_id != self.custom.model_id
+            or content_hash != self._content_hash(content or "")
+            or extra != extra_ids
+            or (self._use_benchmark(letter_id) and bench_model != bench_id)
+        ]
         total = len(rows)
         
-        for idx, (letter_id, content) in enumerate(rows, 1):
-            chunks = sentence_chunks(content or "")
-            s_custom, s_bench = self._predict_pair(chunks)
+        for start in range(0, total, LETTERS_PER_STEP):
+            step = rows[start:start + LETTERS_PER_STEP]
             
-            self._execute(
-                "UPDATE letters SET sentiment=?, sentiment_benchmark=? WHERE id=?",
-                (s_custom, s_bench, letter_id),
-            )
+            chunks = [sentence_chunks(content or "") for _, content, _ in step]
+            scores = self._predict_many(chunks, [self._use_benchmark(letter_id) for letter_id, _, _ in step])
+            extra_scores = {col: self._predict_with(scorer, chunks) for col, scorer in zip(extra_columns, self.extra.values())}
             
-            print(f"\rProcessed {idx}/{total} id={letter_id}", end="", flush=True)
+            with self._db_connection() as (conn, cur):
+                # letters outside the benchmark sample keep their previous benchmark score
+                cur.executemany(
+                    """
+                    UPDATE letters
+                    SET sentiment=?, sentiment_benchmark=COALESCE(?, sentiment_benchmark),
+                        sentiment_benchmark_model=COALESCE(?, sentiment_benchmark_model), content_hash=?, sentiment_model=?
+                    WHERE id=?
+                    """,
+                    [
+                        (s_custom, s_bench, bench_id if s_bench is not None else None, content_hash, self.custom.model_id, letter_id)
+                        for (letter_id, _, content_hash), (s_custom, s_bench) in zip(step, scores)
+                    ],
+                )
+                
+                for (col, col_scores), model_id in zip(extra_scores.items(), extra_ids):
+                    cur.executemany(
+                        f"UPDATE letters SET {col}=?, {col}_model=? WHERE id=?",
+                        [(score, model_id, letter_id) for (letter_id, _, _), score in zip(step, col_scores)],
+                    )
+                
+                conn.commit()
+            
+            print(f"\rProcessed {start + len(step)}/{total} id={step[-1][0]}", end="", flush=True)
         
         print("\nSentiment analysis completed.")
 
+        if self.cache is not None:
+            print(f"Sentence cache: {self.cache.hits} hits, {self.cache.misses} misses ({self.cache.hit_rate():.1%} hit rate)")
+
 if __name__ == "__main__":
-    inference = SentimentAnalysis()
-    inference.run()
+    from export import EXPORT_FORMATS # torch only, the modeling code is imported when exporting
+
+    parser = argparse.ArgumentParser(description='Score letters with the sentiment models')
+    parser.add_argument('--benchmark-sample', type=float, default=BENCHMARK_SAMPLE, help='Fraction of letters also scored by the benchmark model (0 disables it)')
+    parser.add_argument('--parallel', action='store_true', help='Run the custom and benchmark models concurrently')
+    parser.add_argument('--force', action='store_true', help='Rescore every letter, even unchanged ones')
+    parser.add_argument('--no-sentence-cache', action='store_true', help='Score every sentence instead of reusing cached probabilities')
+    parser.add_argument('--int8', action='store_true', help='Score with the dynamically quantized custom model on CPU')
+    parser.add_argument('--backend', choices=["torch", *EXPORT_FORMATS], default="torch", help='Runtime for the custom model')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads for the model runtime')
+    parser.add_argument('--adapter', action='append', default=[], metavar='NAME=DIR', help='Serve an unmerged LoRA adapter over the shared base model (repeatable, the first one drives `sentiment`)')
+    args = parser.parse_args()
+
+    inference = SentimentAnalysis(
+        benchmark_sample=args.benchmark_sample,
+        parallel=args.parallel,
+        sentence_cache=not args.no_sentence_cache,
+        quantized=args.int8,
+        backend=args.backend,
+        num_threads=args.threads,
+        adapters=dict(adapter.split("=", 1) for adapter in args.adapter) or None,
+    )
+    inference.run(force=args.force)
@@ -1,4 +1,5 @@
 import torch
+import argparse
 from pathlib import Path
 from peft import PeftModel, PeftConfig
 
@@ -7,8 +8,11 @@ from transformers import (
     AutoTokenizer,
 )
 
+from export import EXPORT_FORMATS, export_model
+from quantize import save_quantized
 
-def merge_lora(adapter_dir: str, output_dir: str) -> None:
+
+def merge_lora(adapter_dir: str, output_dir: str, int8: bool = False, export: str | None = None) -> None:
     adapter_dir = Path(adapter_dir)
     output_dir  = Path(output_dir)
 
@@ -38,9 +42,24 @@ def merge_lora(adapter_dir: str, output_dir: str) -> None:
     print(f"✔  Merged model written to: {output_dir.resolve()}\n"
           f"   Load with: AutoModelForSequenceClassification.from_pretrained('{output_dir}')")
 
+    # 6) Optionally write a dynamically quantized INT8 copy for CPU serving
+    if int8:
+        save_quantized(output_dir)
+
+    # 7) Optionally export a TorchScript / ONNX graph for the lightweight inference backends
+    if export:
+        export_model(output_dir, fmt=export)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Merge the LoRA adapter into its base classifier')
+    parser.add_argument('--int8', action='store_true', help='Also write a dynamically quantized INT8 variant')
+    parser.add_argument('--export', choices=list(EXPORT_FORMATS), default=None, help='Also export the merged model graph')
+    args = parser.parse_args()
+
     merge_lora(
         adapter_dir="models/bert-portuguese-finance-sentiment",
         output_dir="models/sentiment-bert-portuguese-asset-management-cls",
+        int8=args.int8,
+        export=args.export,
     )
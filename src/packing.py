@@ -0,0 +1,92 @@
+import torch
+import warnings
+from typing import Dict, Iterable, Iterator, List
+
+from datasets import Dataset, DatasetDict
+from transformers import DataCollatorForLanguageModeling
+
+
+def iter_blocks(sequences: Iterable[List[int]], cls_id: int, pad_id: int, block_size: int = 512) -> Iterator[Dict[str, List[int]]]:
+    """
+    Streams tokenized chunks ([CLS] ... [SEP]) into blocks of exactly `block_size` tokens.
+    Every block opens with a single [CLS] and the chunks inside it keep their closing [SEP]
+    as the boundary; a chunk that does not fit carries over into the next block. Each token
+    is tagged with the index of the chunk it came from in `document_ids`. The last, partial
+    block is padded and masked out, so a split shorter than one block still yields a row.
+    """
+    input_ids: List[int] = []
+    document_ids: List[int] = []
+
+    for document, ids in enumerate(sequences):
+        if ids[:1] == [cls_id]:
+            ids = ids[1:]
+
+        while ids:
+            if not input_ids:
+                input_ids.append(cls_id)
+                document_ids.append(document)
+
+            taken, ids = ids[:block_size - len(input_ids)], ids[block_size - len(input_ids):]
+
+            input_ids.extend(taken)
+            document_ids.extend([document] * len(taken))
+
+            if len(input_ids) == block_size:
+                yield {"input_ids": input_ids, "attention_mask": [1] * block_size, "document_ids": document_ids}
+
+                input_ids, document_ids = [], []
+
+    if input_ids:
+        padding = block_size - len(input_ids)
+
+        yield {
+            "input_ids": input_ids + [pad_id] * padding,
+            "attention_mask": [1] * len(input_ids) + [0] * padding,
+            "document_ids": document_ids + [-1] * padding, # padding only ever attends to padding
+        }
+
+def pack_dataset(dataset: Dataset, cls_id: int, pad_id: int, block_size: int = 512, batch_size: int = 1000) -> Dataset:
+    """Packs a tokenized split; rows are read in batches and blocks are written to Arrow as they fill."""
+    def blocks():
+        sequences = (ids for batch in dataset.iter(batch_size=batch_size) for ids in batch["input_ids"])
+
+        yield from iter_blocks(sequences, cls_id, pad_id, block_size)
+
+    return Dataset.from_generator(blocks)
+
+def pack_splits(dataset_dict: DatasetDict, cls_id: int, pad_id: int, block_size: int = 512) -> DatasetDict:
+    packed = {}
+
+    for split, dataset in dataset_dict.items():
+        if len(dataset) == 0:
+            # from_generator cannot build a dataset without rows
+            warnings.warn(f"Split '{split}' is empty, nothing to pack")
+            continue
+
+        packed[split] = pack_dataset(dataset, cls_id, pad_id, block_size)
+
+    return DatasetDict(packed)
+
+
+class DocumentMaskCollator(DataCollatorForLanguageModeling):
+    """
+    MLM collator for packed blocks that keeps every chunk from attending to the other chunks
+    of its block. The padding mask is replaced by a (batch, seq, seq) block-diagonal mask built
+    from `document_ids`, and positions restart at each chunk. Padding of the last block has its
+    own id (-1), so real tokens never attend to it.
+    """
+
+    def __call__(self, features, return_tensors=None):
+        document_ids = torch.tensor([feature.pop("document_ids") for feature in features])
+
+        batch = super().__call__(features, return_tensors)
+
+        index = torch.arange(document_ids.shape[1]).expand_as(document_ids)
+
+        starts = torch.ones_like(document_ids, dtype=torch.bool)
+        starts[:, 1:] = document_ids[:, 1:] != document_ids[:, :-1]
+
+        batch["attention_mask"] = (document_ids[:, :, None] == document_ids[:, None, :]).long()
+        batch["position_ids"] = index - torch.where(starts, index, 0).cummax(dim=1).values
+
+        return batch
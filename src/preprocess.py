@@ -5,53 +5,42 @@ import csv
 import sqlite3
 import random
 import argparse
-from typing import List, Dict
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Dict, Iterable, Iterator, Optional
+
+from chunking import batch_chunks, iter_chunks
 
 conn = sqlite3.connect('letters.db')
 cursor = conn.cursor()
 
-split_pattern = re.compile(r'(?<=[.!?])(?:["”’\)\]]+)?\s+')
 token_pattern = re.compile(r'\S+')
 
+LETTERS_QUERY = '''
+    SELECT gestora, title, content 
+    FROM letters
+    WHERE content IS NOT NULL 
+        AND content <> ''
+        AND (gestora <> 'Encore' AND title NOT LIKE '%Comentário%')
+'''
+
 def read_data() -> List:
-    cursor.execute(
-        '''
-        SELECT gestora, title, content 
-        FROM letters
-        WHERE content IS NOT NULL 
-            AND content <> ''
-            AND (gestora <> 'Encore' AND title NOT LIKE '%Comentário%')
-        '''
-    )
+    cursor.execute(LETTERS_QUERY)
     data = cursor.fetchall()
     
     return data
 
-def sanitize_text(text: str) -> str:
-
-    substitutions = {
-        "Œ": "ê",
-        "ªo": "ão",
-        "Æ": "á",
-        "Ø": "é",
-        "ª": "ã",
-    }
+def iter_letters(batch_size: int = 64) -> Iterator[List]:
+    """Same rows as read_data, fetched `batch_size` at a time instead of all at once."""
+    cursor.execute(LETTERS_QUERY)
 
-    for k, v in substitutions.items():
-        text = text.replace(k, v)
+    while True:
+        rows = cursor.fetchmany(batch_size)
 
-    # remover separações hifenizadas entre linhas
-    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+        if not rows:
+            return
 
-    # remover quebras de linha no meio de frases
-    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
-
-    text = text.replace("\n", " ")
-    text = " ".join(text.split())
-
-    text = text.strip()
-    
-    return text
+        yield rows
 
 def split_transcription(text: str, chunk_size: int = 500, overlap: int = 5) -> List[str]:
     tokens = token_pattern.findall(text)
@@ -81,33 +70,132 @@ def generate_chunks(data: List, min_size: int = 20, max_size: int = 500, thresho
     for row in data:
         text = row[2]
         gestora, title = row[0], row[1]
-            
-        sentences = split_pattern.split(text)
-
-        for sentence in sentences:
-            sentence = sanitize_text(sentence)
-            sentence_len = len(sentence)
-            
-            if sentence_len == 0:
-                continue
-
-            not_letter = sum(1 for c in sentence if not c.isalpha() and not c.isspace())
-
-            if (not_letter / sentence_len) > threshold:
-                continue
-            
-            tokens = token_pattern.findall(sentence)
-            token_count = len(tokens)
-
-            if token_count < min_size:
-                continue
-
-            if token_count <= max_size:
-                chunks.append({'text': sentence})
-                continue
+
+        # the whole letter is sanitized once, then split and filtered in a single pass
+        chunks.extend({'text': sentence} for sentence in iter_chunks(text, min_size, max_size, threshold))
     
     return chunks
     
+def stream_chunks(
+    batches: Iterable[List],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    window: Optional[int] = None,
+    min_size: int = 20,
+    max_size: int = 500,
+    threshold: float = 0.05,
+) -> Iterator[str]:
+    """
+    Chunks every letter of `batches` on a process pool, one task per batch. At most
+    `window` batches are in flight, so memory does not grow with the corpus. With
+    `ordered=False` batches are yielded as soon as they finish.
+    """
+    workers = workers or os.cpu_count()
+    window = window or 2 * workers
+    batches = iter(batches)
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def refill():
+            while len(pending) < window:
+                rows = next(batches, None)
+
+                if rows is None:
+                    return
+
+                pending.append(pool.submit(batch_chunks, [row[2] for row in rows], min_size, max_size, threshold))
+
+        refill()
+
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = [future for future in pending if future in finished]
+
+                    for future in done:
+                        pending.remove(future)
+
+                refill()
+
+                for future in done:
+                    yield from future.result()
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+class JSONLWriter:
+    """Appends chunks to a JSONL file, or round-robin to `shards` files named <stem>-00000-of-0000N.jsonl."""
+
+    def __init__(self, path: str, shards: int = 1) -> None:
+        if shards > 1:
+            stem, ext = os.path.splitext(path)
+            self.paths = [f"{stem}-{i:05d}-of-{shards:05d}{ext}" for i in range(shards)]
+        else:
+            self.paths = [path]
+
+        self.files = [open(p, 'w', encoding='utf-8') for p in self.paths]
+        self.count = 0
+
+    def write(self, chunk: Dict) -> None:
+        self.files[self.count % len(self.files)].write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def close(self) -> None:
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class Reservoir:
+    """Uniform sample of `size` items from a stream of unknown length (algorithm R)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.items: List = []
+        self.seen = 0
+
+    def add(self, item) -> None:
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = random.randrange(self.seen + 1)
+
+            if j < self.size:
+                self.items[j] = item
+
+        self.seen += 1
+
+def run_streaming(output: str, workers: Optional[int] = None, batch_size: int = 64, shards: int = 1, ordered: bool = True, sample_size: int = 1000) -> Reservoir:
+    """Streams letters from the database to JSONL without holding the corpus in memory."""
+    reservoir = Reservoir(sample_size)
+    total_chars = 0
+
+    with JSONLWriter(output, shards=shards) as writer:
+        for text in stream_chunks(iter_letters(batch_size), workers=workers, ordered=ordered):
+            chunk = {'text': text}
+
+            writer.write(chunk)
+            reservoir.add(chunk)
+            total_chars += len(text)
+
+    print(f"Generated {writer.count} chunks.")
+
+    if writer.count:
+        print(f"Average chunk size: {total_chars / writer.count:.2f} characters.")
+
+    print(f"Data saved to {', '.join(writer.paths)}")
+
+    return reservoir
+
 def create_random_sample(chunks_data: List[Dict], output_file: str, sample_size: int = 1000) -> None:
     sample_size = min(sample_size, len(chunks_data))
 
@@ -126,26 +214,48 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Process letters data and optionally export CSV sample.')
     parser.add_argument('--export', action='store_true', help='Export a random CSV sample of chunk data.')
     parser.add_argument('--path', type=str, help='Path to the CSV output file.')
+    parser.add_argument('--stream', action='store_true', help='Read letters in batches and chunk them on a process pool, writing JSONL incrementally.')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used by --stream (default: all CPUs).')
+    parser.add_argument('--batch-size', type=int, default=64, help='Letters fetched and chunked per task with --stream.')
+    parser.add_argument('--shards', type=int, default=1, help='Split the --stream output into this many JSONL files.')
+    parser.add_argument('--unordered', action='store_true', help='With --stream, write batches as soon as they finish instead of in database order.')
 
     args = parser.parse_args()
-    data = read_data()
-    chunks_data = generate_chunks(data)
 
-    for i in range(11):
-        print(f'Example {i}: ', random.choice(chunks_data))
+    if args.stream:
+        os.makedirs('data', exist_ok=True)
+
+        reservoir = run_streaming(
+            'data/domain_training.jsonl',
+            workers=args.workers,
+            batch_size=args.batch_size,
+            shards=args.shards,
+            ordered=not args.unordered,
+        )
+
+        if args.export:
+            create_random_sample(reservoir.items, sample_size=1000, output_file=args.path)
+            print(f'Random sample of chunks saved to {args.path}')
+
+    else:
+        data = read_data()
+        chunks_data = generate_chunks(data)
+
+        for i in range(11):
+            print(f'Example {i}: ', random.choice(chunks_data))
 
-    print()
-    print(f"Generated {len(chunks_data)} chunks from {len(data)} letters.")
-    print(f"Average chunk size: {sum(len(chunk['text']) for chunk in chunks_data) / len(chunks_data):.2f} characters.")
+        print()
+        print(f"Generated {len(chunks_data)} chunks from {len(data)} letters.")
+        print(f"Average chunk size: {sum(len(chunk['text']) for chunk in chunks_data) / len(chunks_data):.2f} characters.")
 
-    os.makedirs('data', exist_ok=True)
+        os.makedirs('data', exist_ok=True)
 
-    with open('data/domain_training.jsonl', 'w', encoding='utf-8') as f:
-        for chunk in chunks_data:
-            f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        with open('data/domain_training.jsonl', 'w', encoding='utf-8') as f:
+            for chunk in chunks_data:
+                f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
 
-    print('Data saved to data/domain_training.jsonl')
+        print('Data saved to data/domain_training.jsonl')
 
-    if args.export:
-        create_random_sample(chunks_data, sample_size=1000, output_file=args.path)
-        print(f'Random sample of chunks saved to {args.path}')
\ No newline at end of file
+        if args.export:
+            create_random_sample(chunks_data, sample_size=1000, output_file=args.path)
+            print(f'Random sample of chunks saved to {args.path}')
\ No newline at end of file
@@ -0,0 +1,119 @@
+import csv
+import time
+import torch
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, List
+from sklearn.metrics import accuracy_score, f1_score
+
+from transformers import (
+    AutoConfig,
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+)
+
+QUANTIZED_WEIGHTS = "quantized_model.pt"
+
+
+def quantized_dir(model_dir: str) -> Path:
+    """Where the INT8 variant of a merged classifier is written, next to the fp32 one."""
+    return Path(f"{Path(model_dir)}-int8")
+
+def quantize_dynamic(model):
+    # Linear layers carry almost all of BERT's compute; activations are quantized on the fly
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def save_quantized(model_dir: str, output_dir: str | None = None) -> Path:
+    output_dir = Path(output_dir) if output_dir else quantized_dir(model_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model     = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, do_lower_case=False)
+
+    # packed int8 weights are not safetensors-compatible, so only the state dict is pickled
+    torch.save(quantize_dynamic(model).state_dict(), output_dir / QUANTIZED_WEIGHTS)
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    print(f"✔  INT8 model written to: {output_dir.resolve()}")
+
+    return output_dir
+
+def load_quantized(model_dir: str):
+    """Rebuilds the architecture from the config, quantizes it, then loads the int8 weights (CPU only)."""
+    config = AutoConfig.from_pretrained(model_dir)
+    model  = quantize_dynamic(AutoModelForSequenceClassification.from_config(config))
+
+    model.load_state_dict(torch.load(Path(model_dir) / QUANTIZED_WEIGHTS))
+    model.config._name_or_path = str(model_dir)
+
+    return model.eval()
+
+
+# REPORT
+
+def _read_test_split(path: str) -> List[Dict]:
+    from train_domain import split_dataset
+
+    with open(path, 'r', newline='') as csvfile:
+        data = [dict(row) for row in csv.DictReader(csvfile)]
+
+    # same split as train_cls.py, so the report scores sentences the adapter never saw
+    return split_dataset(data)["test"].to_list()
+
+def _evaluate(model, tokenizer, texts: List[str], labels: List[int], batch_size: int) -> Dict[str, float]:
+    preds = []
+
+    start = time.perf_counter()
+
+    with torch.inference_mode():
+        for i in range(0, len(texts), batch_size):
+            inputs = tokenizer(texts[i:i + batch_size], padding=True, truncation=True, max_length=512, return_tensors="pt")
+            preds.extend(model(**inputs).logits.argmax(dim=-1).tolist())
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "accuracy": accuracy_score(labels, preds),
+        "f1": f1_score(labels, preds, average="macro"),
+        "ms_per_sentence": 1000 * elapsed / max(len(texts), 1),
+        "preds": np.asarray(preds),
+    }
+
+def report(model_dir: str, data_path: str, batch_size: int = 32, threads: int | None = None) -> None:
+    """Accuracy and CPU latency of the INT8 variant against the fp32 model on the train_cls test split."""
+    if threads:
+        torch.set_num_threads(threads)
+
+    rows   = _read_test_split(data_path)
+    texts  = [row["text"] for row in rows]
+    labels = [int(row["label"]) for row in rows]
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, do_lower_case=False)
+
+    fp32 = _evaluate(AutoModelForSequenceClassification.from_pretrained(model_dir).eval(), tokenizer, texts, labels, batch_size)
+    int8 = _evaluate(load_quantized(quantized_dir(model_dir)), tokenizer, texts, labels, batch_size)
+
+    print(f"Test sentences: {len(texts)}, threads: {torch.get_num_threads()}, batch size: {batch_size}")
+
+    for name, result in (("fp32", fp32), ("int8", int8)):
+        print(f"{name} - Accuracy: {result['accuracy']:.4f}, F1: {result['f1']:.4f}, {result['ms_per_sentence']:.2f} ms/sentence")
+
+    print(f"Speedup: {fp32['ms_per_sentence'] / int8['ms_per_sentence']:.2f}x, "
+          f"prediction agreement: {(fp32['preds'] == int8['preds']).mean():.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quantize the merged classifier to INT8 and compare it with fp32')
+    parser.add_argument('--model-dir', default="models/sentiment-bert-portuguese-asset-management-cls", help='Merged fp32 classifier')
+    parser.add_argument('--data', default="data/cls_training.csv", help='Sentiment CSV used by train_cls.py')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads')
+    parser.add_argument('--skip-export', action='store_true', help='Reuse an existing INT8 model')
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        save_quantized(args.model_dir)
+
+    report(args.model_dir, args.data, batch_size=args.batch_size, threads=args.threads)
@@ -1,9 +1,13 @@
+import os
 import csv
+import glob
+import json
 import torch
+import hashlib
 import argparse
 import warnings
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
 from sklearn.metrics import accuracy_score, f1_score
 
 from peft import LoraConfig, get_peft_model, TaskType
@@ -16,11 +20,47 @@ from transformers import (
     logging,
 )
 
-from train_domain import DomainTrainer
+from datasets import Dataset
+from huggingface_hub import try_to_load_from_cache
+
+from train_domain import DomainTrainer, files_fingerprint, print_throughput
 
 logging.set_verbosity_error()
 warnings.filterwarnings("ignore", message="Can't initialize NVML")
 
+EVAL_CACHE_DIR = os.path.join(".cache", "eval")
+
+BASE_MODEL = "neuralmind/bert-base-portuguese-cased"
+BENCHMARK_MODEL = "lucas-leme/FinBERT-PT-BR"
+
+
+def cpu_supports_bf16() -> bool:
+    """bf16 autocast only pays off with native bf16 instructions (AVX512-BF16 or AMX); otherwise it is emulated and slower than fp32."""
+    return any(getattr(torch.cpu, name, lambda: False)() for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+
+def split_fingerprint(dataset: Dataset) -> str:
+    """Hash of the texts and labels of a split, so cached evaluations are dropped when the split changes."""
+    digest = hashlib.sha1()
+
+    for batch in dataset.select_columns(["text", "label"]).iter(batch_size=1000):
+        digest.update(json.dumps(batch, sort_keys=True).encode())
+
+    return digest.hexdigest()
+
+def model_revision(model_id: str) -> Optional[str]:
+    """
+    Snapshot `model_id` resolves to, found without loading it: a digest of the files of a
+    local checkpoint, or the commit sha of the snapshot in the local hub cache. None when
+    the model was never downloaded.
+    """
+    if os.path.isdir(model_id):
+        return files_fingerprint(sorted(glob.glob(os.path.join(model_id, "*"))))
+
+    config_path = try_to_load_from_cache(model_id, "config.json")
+
+    # <hub cache>/models--org--name/snapshots/<commit sha>/config.json
+    return os.path.basename(os.path.dirname(config_path)) if isinstance(config_path, str) else None
+
 
 class WeightedTrainer(Trainer):
     def compute_loss(self, model, inputs, num_items_in_batch=None, return_outputs=False):
@@ -40,11 +80,33 @@ class WeightedTrainer(Trainer):
 
 
 class SentimentTrainer(DomainTrainer):
-    def __init__(self, domain_model: str, sentiment_data_path: str, num_labels: int = 3, smoke_test: bool = False):
+    def __init__(
+        self,
+        domain_model: str,
+        sentiment_data_path: str,
+        num_labels: int = 3,
+        smoke_test: bool = False,
+        cpu: bool = False,
+        threads: int | None = None,
+        interop_threads: int | None = None,
+        eval_cache: bool = True,
+    ):
+        # inter-op threads can only be set before torch starts any parallel work
+        if threads:
+            torch.set_num_threads(threads)
+
+        if interop_threads:
+            torch.set_interop_threads(interop_threads)
+
         self.domain_model = domain_model
         self.sentiment_data_path = sentiment_data_path
         self.num_labels = num_labels
         self.smoke_test = smoke_test
+        self.eval_cache = eval_cache
+
+        # fp16 needs a GPU, so hosts without one always get the CPU profile
+        self.cpu = cpu or not torch.cuda.is_available()
+        self.device = torch.device("cpu" if self.cpu else "cuda")
 
         self.tokenizer = AutoTokenizer.from_pretrained(domain_model, do_lower_case=False)
 
@@ -76,7 +138,11 @@ class SentimentTrainer(DomainTrainer):
             logging_steps=50,
             save_strategy="no",
             remove_unused_columns=False,
-            fp16=True
+            group_by_length=True, # batches of similar length need little padding
+            use_cpu=self.cpu,
+            dataloader_pin_memory=not self.cpu,
+            fp16=not self.cpu,
+            bf16=self.cpu and cpu_supports_bf16() # CPU autocast
         )
 
         if smoke_test:
@@ -85,9 +151,11 @@ class SentimentTrainer(DomainTrainer):
             self.training_args.per_device_eval_batch_size = 4
             self.training_args.logging_steps = 5
 
-        print("Using device:", torch.device("cuda" if torch.cuda.is_available() else "cpu"))
+        print("Using device:", self.device)
 
-        if torch.cuda.is_available():
+        if self.cpu:
+            print(f"CPU threads: {torch.get_num_threads()}, inter-op: {torch.get_num_interop_threads()}, bf16: {self.training_args.bf16}")
+        else:
             print("GPU:", torch.cuda.get_device_name(0))
 
     def _read_training_data(self, path: str) -> List[Dict]:
@@ -101,12 +169,81 @@ class SentimentTrainer(DomainTrainer):
         return data
 
     def _default_data_collator(self, features):
+        # examples are tokenized without padding, so each batch is padded to its own longest row
+        batch = self.tokenizer.pad(
+            [{"input_ids": f["input_ids"], "attention_mask": f["attention_mask"]} for f in features],
+            pad_to_multiple_of=8,
+            return_tensors="pt",
+        )
+        batch["labels"] = torch.tensor([int(f["label"]) for f in features], dtype=torch.long)
+
+        return batch
+
+    def _metrics(self, labels: np.ndarray, preds: np.ndarray) -> Dict[str, float]:
         return {
-            "input_ids": torch.tensor([f["input_ids"] for f in features], dtype=torch.long),
-            "attention_mask": torch.tensor([f["attention_mask"] for f in features], dtype=torch.long),
-            "labels": torch.tensor([int(f["label"]) for f in features], dtype=torch.long),
+            "accuracy": accuracy_score(labels, preds),
+            "f1": f1_score(labels, preds, average="macro"),
         }
 
+    def _eval_cache_path(self, model_id: str, revision: str, test_fingerprint: str) -> str:
+        key = json.dumps({"model": model_id, "revision": revision, "num_labels": self.num_labels, "test": test_fingerprint}, sort_keys=True)
+
+        return os.path.join(EVAL_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:16] + ".json")
+
+    def _baseline_evaluation(self, model_id: str, test_dataset: Dataset) -> Dict[str, float]:
+        """
+        Metrics of an off-the-shelf model on the test split. Predictions and metrics are
+        stored under EVAL_CACHE_DIR per (model id, revision, test split), so later runs
+        neither load the model nor predict again until the weights or the split change.
+        """
+        test_fingerprint = split_fingerprint(test_dataset)
+        revision = model_revision(model_id)
+
+        if self.eval_cache and revision:
+            cache_path = self._eval_cache_path(model_id, revision, test_fingerprint)
+
+            if os.path.exists(cache_path):
+                print(f"Loading {model_id} evaluation from {cache_path}")
+
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)["metrics"]
+
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_id,
+            num_labels=self.num_labels
+        )
+
+        model.config.problem_type = "single_label_classification"
+        model.to(self.device)
+
+        trainer = WeightedTrainer(
+            model=model,
+            args=self.training_args,
+            eval_dataset=test_dataset,
+            data_collator=self._default_data_collator,
+        )
+
+        predictions = trainer.predict(test_dataset)
+        preds = np.argmax(predictions.predictions, axis=1)
+        metrics = self._metrics(predictions.label_ids, preds)
+
+        # a first download is only resolved to a snapshot by from_pretrained
+        revision = revision or getattr(model.config, "_commit_hash", None)
+
+        if revision:
+            os.makedirs(EVAL_CACHE_DIR, exist_ok=True)
+
+            with open(self._eval_cache_path(model_id, revision, test_fingerprint), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "model_id": model_id,
+                    "revision": revision,
+                    "test": test_fingerprint,
+                    "metrics": metrics,
+                    "predictions": preds.tolist(),
+                }, f)
+
+        return metrics
+
     def run(self):
         data = self._read_training_data(self.sentiment_data_path)
         dataset_dict = self._train_test_split(data)
@@ -123,70 +260,31 @@ class SentimentTrainer(DomainTrainer):
             data_collator=self._default_data_collator,
         )
 
-        trainer.train()
+        train_result = trainer.train()
+        print_throughput(train_result.metrics, tokenized_ds["train"])
+
         trainer.save_model("models/bert-portuguese-finance-sentiment")
 
         # evaluate
         predictions = trainer.predict(tokenized_ds["test"])
-        preds = np.argmax(predictions.predictions, axis=1)
-        labels = predictions.label_ids
-        acc_domain = accuracy_score(labels, preds)
-        f1_domain = f1_score(labels, preds, average="macro")
-        
-        print(f"Domain Adapted Model - Accuracy: {acc_domain:.4f}, F1: {f1_domain:.4f}")
-
-        # evaluate base model: neuralmind/bert-base-portuguese-cased
-        
-        base_model = AutoModelForSequenceClassification.from_pretrained(
-            "neuralmind/bert-base-portuguese-cased",
-            num_labels=self.num_labels
-        )
-
-        base_model.to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-        
-        base_trainer = WeightedTrainer(
-            model=base_model,
-            args=self.training_args,
-            eval_dataset=tokenized_ds["test"],
-            data_collator=self._default_data_collator,
-        )
+        domain = self._metrics(predictions.label_ids, np.argmax(predictions.predictions, axis=1))
+        print(f"Domain Adapted Model - Accuracy: {domain['accuracy']:.4f}, F1: {domain['f1']:.4f}")
 
-        base_predictions = base_trainer.predict(tokenized_ds["test"])
-        base_preds = np.argmax(base_predictions.predictions, axis=1)
-        acc_base = accuracy_score(labels, base_preds)
-        f1_base = f1_score(labels, base_preds, average="macro")
-        
-        print(f"Base Model - Accuracy: {acc_base:.4f}, F1: {f1_base:.4f}")
+        # base and benchmark models do not change between runs, only the test split does
+        base = self._baseline_evaluation(BASE_MODEL, tokenized_ds["test"])
+        print(f"Base Model - Accuracy: {base['accuracy']:.4f}, F1: {base['f1']:.4f}")
 
-        # evaluate benchmark model: lucas-leme/FinBERT-PT-BR
-        
-        benchmark_model = AutoModelForSequenceClassification.from_pretrained(
-            "lucas-leme/FinBERT-PT-BR",
-            num_labels=self.num_labels
-        )
-        
-        benchmark_model.config.num_labels = self.num_labels
-        benchmark_model.config.problem_type = "single_label_classification"
-        benchmark_model.to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-        
-        benchmark_trainer = WeightedTrainer(
-            model=benchmark_model,
-            args=self.training_args,
-            eval_dataset=tokenized_ds["test"],
-            data_collator=self._default_data_collator,
-        )
-        
-        benchmark_predictions = benchmark_trainer.predict(tokenized_ds["test"])
-        benchmark_preds = np.argmax(benchmark_predictions.predictions, axis=1)
-        acc_benchmark = accuracy_score(labels, benchmark_preds)
-        f1_benchmark = f1_score(labels, benchmark_preds, average="macro")
-        
-        print(f"Benchmark Model (FinBERT-PT-BR) - Accuracy: {acc_benchmark:.4f}, F1: {f1_benchmark:.4f}")
+        benchmark = self._baseline_evaluation(BENCHMARK_MODEL, tokenized_ds["test"])
+        print(f"Benchmark Model (FinBERT-PT-BR) - Accuracy: {benchmark['accuracy']:.4f}, F1: {benchmark['f1']:.4f}")
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Sentiment Fine-Tuning')
     parser.add_argument('--smoke-test', action='store_true', help='Run quick smoke test')
+    parser.add_argument('--cpu', action='store_true', help='Train on CPU (bf16 autocast where supported), also used when no GPU is found')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op CPU threads')
+    parser.add_argument('--interop-threads', type=int, default=None, help='torch inter-op CPU threads')
+    parser.add_argument('--no-eval-cache', action='store_true', help='Evaluate the base and benchmark models again')
     args = parser.parse_args()
 
     domain_checkpoint = "models/bert-portuguese-asset-management"  # from domain trainer
@@ -197,7 +295,11 @@ if __name__ == '__main__':
         domain_model=domain_checkpoint,
         sentiment_data_path=sentiment_data_path,
         num_labels=3, 
-        smoke_test=args.smoke_test
+        smoke_test=args.smoke_test,
+        cpu=args.cpu,
+        threads=args.threads,
+        interop_threads=args.interop_threads,
+        eval_cache=not args.no_eval_cache
     )
 
     sentiment_trainer.run()
@@ -1,7 +1,10 @@
+import os
+import glob
 import json
 import math
 import torch
 import random
+import hashlib
 import argparse
 import warnings
 from typing import List, Dict
@@ -19,14 +22,56 @@ from transformers import (
     logging,
 )
 
+from packing import DocumentMaskCollator, pack_splits
+
 logging.set_verbosity_error()
 warnings.filterwarnings("ignore", message="Can't initialize NVML")
 
+SPLIT_SEED = 55
+TOKENIZED_CACHE_DIR = os.path.join(".cache", "tokenized")
+
+
+def split_dataset(data: List[Dict] | Dataset, test_size: float = 0.2, seed: int = SPLIT_SEED) -> DatasetDict:
+    """Train / validation / test split, reproducible so later evaluations see the same test set."""
+    dataset = data if isinstance(data, Dataset) else Dataset.from_list(data)
+
+    train_test_split = dataset.train_test_split(test_size=test_size, seed=seed, shuffle=True)
+    validation_test_split = train_test_split['test'].train_test_split(test_size=0.5, seed=seed)
+
+    return DatasetDict({
+        'train': train_test_split['train'],
+        'validation': validation_test_split['train'],
+        'test': validation_test_split['test']
+    })
+
+def print_throughput(metrics: Dict[str, float], dataset: Dataset) -> None:
+    """Trainer's samples/s next to real (non-padding) tokens/s, which is what padding changes affect."""
+    tokens = sum(sum(map(sum, batch["attention_mask"])) for batch in dataset.iter(batch_size=1000))
+    epochs = metrics.get("epoch", 1.0)
+
+    print(f"Train samples/s: {metrics['train_samples_per_second']:.2f}, "
+          f"real tokens/s: {tokens * epochs / metrics['train_runtime']:.0f}")
+
+def files_fingerprint(paths: List[str]) -> str:
+    digest = hashlib.sha1()
+
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    return digest.hexdigest()
+
 
 class DomainTrainer:
+    max_length = 512
+
+    def __init__(self, base_model: str, path: str, smoke_test: bool = False, packing: bool = False, document_attention: bool = False) -> None:
+        if document_attention and not packing:
+            raise ValueError("document_attention only applies to packed blocks")
 
-    def __init__(self, base_model: str, path: str, smoke_test: bool = False) -> None:
         self.path = path
+        self.packing = packing
+        self.document_attention = document_attention
 
         self.base_model_name = base_model
 
@@ -46,9 +91,10 @@ class DomainTrainer:
             weight_decay=0.01,
             logging_steps=100,
             save_strategy="no",
+            group_by_length=not packing, # batches of similar length need little padding
+            remove_unused_columns=not document_attention, # the collator needs document_ids, which the model does not take
             fp16=True
         )
-
         if smoke_test:
             # max_steps overrides num_train_epochs, so the training ends quickly.
             self.training_args.max_steps = 10
@@ -68,8 +114,7 @@ class DomainTrainer:
         return self.tokenizer(
             examples["text"], 
             truncation=True,           # ensures sequences longer than max_length are cut off
-            padding="max_length",      # pads all sequences to the max_length
-            max_length=512             # sets the maximum length
+            max_length=self.max_length # sets the maximum length, padding is left to the collator
         )
 
     def _read_training_data(self, path: str) -> List[Dict]:
@@ -84,39 +129,105 @@ class DomainTrainer:
     def _train_test_split(self, data: List[Dict], test_size: float = 0.2) -> DatasetDict:
         
         if self.training_args.max_steps == 10:
-            data = random.sample(data, 100)
+            if isinstance(data, Dataset):
+                data = data.select(random.sample(range(len(data)), 100))
+            else:
+                data = random.sample(data, 100)
         
-        dataset = Dataset.from_list(data)
-
-        train_test_split = dataset.train_test_split(test_size=test_size, seed=55, shuffle=True)
-        validation_test_split = train_test_split['test'].train_test_split(test_size=0.5)
-
-        train = train_test_split['train']
-        validation = validation_test_split['train']
-        test = validation_test_split['test']
-
-        return DatasetDict({
-            'train': train,
-            'validation': validation,
-            'test': test
-        })
+        return split_dataset(data, test_size=test_size)
     
-    def run(self) -> None:
-        # read data and create train/validation/test split
-        data = self._read_training_data(self.path)
-        dataset_dict = self._train_test_split(data)
+    def _data_files(self) -> List[str]:
+        """
+        The JSONL itself, or its shards written by `preprocess.py --stream --shards N`.
+        When both exist the most recently written output wins, so an older run never
+        shadows a newer one.
+        """
+        stem, ext = os.path.splitext(self.path)
+        shards = sorted(glob.glob(f"{stem}-*-of-*{ext}"))
+
+        if shards:
+            # runs with another --shards count leave files behind, keep the newest set
+            sets: Dict[str, List[str]] = {}
+
+            for shard in shards:
+                sets.setdefault(shard.rsplit("-of-", 1)[1], []).append(shard)
+
+            shards = max(sets.values(), key=lambda paths: max(map(os.path.getmtime, paths)))
+
+        if not os.path.exists(self.path):
+            if not shards:
+                raise FileNotFoundError(self.path)
+
+            return shards
+
+        if shards and max(map(os.path.getmtime, shards)) > os.path.getmtime(self.path):
+            print(f"Training on {len(shards)} shards, newer than {self.path}")
+            return shards
+
+        return [self.path]
+
+    def _tokenized_cache_path(self, data_files: List[str]) -> str:
+        if self.tokenizer.is_fast:
+            tokenizer_state = self.tokenizer.backend_tokenizer.to_str()
+        else:
+            tokenizer_state = self.tokenizer.name_or_path
+
+        key = json.dumps({
+            "tokenizer": hashlib.sha1(tokenizer_state.encode()).hexdigest(),
+            "max_length": self.max_length,
+            "padding": "packed" if self.packing else "dynamic",
+            "seed": SPLIT_SEED,
+            "data": files_fingerprint(data_files),
+        }, sort_keys=True)
+
+        return os.path.join(TOKENIZED_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+    def _tokenized_dataset(self) -> DatasetDict:
+        """
+        Tokenized train/validation/test splits, saved as Arrow under a fingerprint of the
+        tokenizer, max_length, split seed and data files. Later launches memory-map them
+        with `load_from_disk` instead of tokenizing again.
+        """
+        data_files = self._data_files()
+        cache_path = self._tokenized_cache_path(data_files)
+        smoke_test = self.training_args.max_steps == 10 # random subset, not worth caching
+
+        if not smoke_test and os.path.isdir(cache_path):
+            print(f"Loading tokenized dataset from {cache_path}")
+            return DatasetDict.load_from_disk(cache_path)
+
+        # the JSONL is streamed into Arrow instead of a list of dicts
+        dataset = Dataset.from_json(data_files)
+        dataset_dict = self._train_test_split(dataset)
 
-        # tokenize dataset
         tokenized_dataset = dataset_dict.map(
             self._tokenize_function, 
             batched=True,
             remove_columns=["text"]
         )
 
-        data_collator = DataCollatorForLanguageModeling(
+        if self.packing:
+            # only train and validation are read, the test split is not worth packing
+            del tokenized_dataset["test"]
+
+            tokenized_dataset = pack_splits(tokenized_dataset, self.tokenizer.cls_token_id, self.tokenizer.pad_token_id, self.max_length)
+
+        if not smoke_test:
+            tokenized_dataset.save_to_disk(cache_path)
+
+        return tokenized_dataset
+
+    def run(self) -> None:
+        # read data, create train/validation/test split and tokenize, or load all of it from the cache
+        tokenized_dataset = self._tokenized_dataset()
+
+        collator_class = DocumentMaskCollator if self.document_attention else DataCollatorForLanguageModeling
+
+        data_collator = collator_class(
             tokenizer=self.tokenizer, 
             mlm=True, 
-            mlm_probability=0.15
+            mlm_probability=0.15,
+            pad_to_multiple_of=8 # tensor core friendly shapes under fp16
         )
 
         # create a new trainer for fine-tuning the PEFT model
@@ -128,7 +239,8 @@ class DomainTrainer:
             data_collator=data_collator
         )
 
-        trainer.train()
+        train_result = trainer.train()
+        print_throughput(train_result.metrics, tokenized_dataset['train'])
 
         eval_results_ft = trainer.evaluate()
         
@@ -157,12 +269,14 @@ class DomainTrainer:
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Train a domain-specific language model')
     parser.add_argument('--smoke-test', action='store_true', help='Run in smoke test mode (fast training with sample data)')
+    parser.add_argument('--pack', action='store_true', help='Concatenate chunks into full 512-token blocks instead of padding each one')
+    parser.add_argument('--document-attention', action='store_true', help='With --pack, keep chunks of a block from attending to each other')
     args = parser.parse_args()
 
     base_model = "neuralmind/bert-base-portuguese-cased"
     path = 'data/domain_training.jsonl'
 
-    trainer = DomainTrainer(base_model, path, smoke_test=args.smoke_test)
+    trainer = DomainTrainer(base_model, path, smoke_test=args.smoke_test, packing=args.pack, document_attention=args.document_attention)
 
     trainer.run()
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules under src/ import their siblings directly (python3 src/<script>.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,52 @@
+import numpy as np
+
+from inference import aggregate_scores
+
+POS, NEG = 1, 0
+
+
+def reference_score(probs: np.ndarray) -> int:
+    """Per-letter loop the vectorized aggregation replaced."""
+    if len(probs) == 0:
+        return 50
+
+    scores, weights = [], []
+
+    for row in probs.astype(np.float64):
+        p_pos, p_neg = row[POS], row[NEG]
+        w = p_pos + p_neg
+
+        scores.append((p_pos - p_neg) / w if w else p_pos - p_neg)
+        weights.append(w)
+
+    if not sum(weights):
+        return 50
+
+    S = np.dot(scores, weights) / sum(weights)
+    S = np.sign(S) * abs(S) ** 0.75
+
+    return int(50 * (S + 1))
+
+def test_aggregate_scores_matches_reference():
+    rng = np.random.default_rng(0)
+
+    lengths = [0, 1, 5, 0, 12, 3, 0]
+    probs = rng.dirichlet(np.ones(3), size=sum(lengths)).astype(np.float32)
+    offsets = np.cumsum([0] + lengths)
+
+    expected = [reference_score(probs[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    assert aggregate_scores(probs, offsets, POS, NEG).tolist() == expected
+
+def test_aggregate_scores_neutral_and_polar_letters():
+    probs = np.array([
+        [0.0, 0.0, 1.0],  # letter 0: only neutral chunks, no weight
+        [0.0, 0.0, 1.0],
+        [0.0, 1.0, 0.0],  # letter 1: fully positive
+        [1.0, 0.0, 0.0],  # letter 2: fully negative
+    ], dtype=np.float32)
+
+    assert aggregate_scores(probs, np.array([0, 2, 3, 4]), POS, NEG).tolist() == [50, 100, 0]
+
+def test_aggregate_scores_without_chunks():
+    assert aggregate_scores(np.zeros((0, 3), dtype=np.float32), np.array([0, 0, 0]), POS, NEG).tolist() == [50, 50]
@@ -0,0 +1,28 @@
+import pytest
+
+from inference import token_budget_batches
+
+
+@pytest.mark.parametrize("lengths, budget", [
+    ([5, 40, 12, 7, 33, 12, 8, 90], 100),
+    ([10] * 25, 64),
+    ([512, 3, 600, 4], 256), # rows longer than the budget
+    ([], 100),
+])
+def test_token_budget_batches(lengths, budget):
+    batches = token_budget_batches(lengths, budget)
+
+    # every index exactly once
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+
+        # a single row may exceed the budget, a padded batch never does
+        assert len(batch) == 1 or len(batch) * longest <= budget
+
+        # sorted by length, so the last member is the longest
+        assert lengths[batch[-1]] == longest
+
+def test_token_budget_batches_groups_similar_lengths():
+    assert token_budget_batches([50, 2, 48, 3, 1], budget=100) == [[4, 1, 3], [2, 0]]
@@ -0,0 +1,35 @@
+import os
+
+from services.cache import HTTPCache
+
+
+def blobs(cache):
+    return os.listdir(os.path.join(cache.path, "blobs"))
+
+def test_changed_content_replaces_blob(tmp_path):
+    cache = HTTPCache(path=str(tmp_path), max_size=250)
+
+    for i in range(5):
+        cache.store("https://example.com/cartas", f"pagina {i}".encode() * 10, {"ETag": f'"{i}"'})
+
+    assert len(blobs(cache)) == 1
+    assert cache.load("https://example.com/cartas") == b"pagina 4" * 10
+
+def test_shared_blob_survives_replacement(tmp_path):
+    cache = HTTPCache(path=str(tmp_path))
+
+    cache.store("https://example.com/a", b"carta", {"ETag": '"a"'})
+    cache.store("https://example.com/b", b"carta", {"ETag": '"b"'})
+    cache.store("https://example.com/a", b"nova carta", {"ETag": '"c"'})
+
+    assert len(blobs(cache)) == 2
+    assert cache.load("https://example.com/b") == b"carta"
+
+def test_eviction_enforces_size_cap(tmp_path):
+    cache = HTTPCache(path=str(tmp_path), max_size=250)
+
+    for i in range(5):
+        cache.store(f"https://example.com/{i}", bytes([i]) * 100, {"ETag": f'"{i}"'})
+
+    assert sum(os.path.getsize(os.path.join(cache.path, "blobs", blob)) for blob in blobs(cache)) <= 250
+    assert cache.load("https://example.com/4") == bytes([4]) * 100
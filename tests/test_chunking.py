@@ -0,0 +1,37 @@
+import random
+import pytest
+
+from bench_chunking import legacy_sentence_chunks
+from chunking import sentence_chunks
+
+LONG = "O fundo encerrou o ano com retorno acima do índice e manteve a carteira concentrada em empresas com bons fundamentos"
+
+TEXTS = [
+    # hyphenated line breaks
+    f"A gestão continua otimista com a recu-\nperação da economia. {LONG}. Seguimos atentos ao ce-\nnário externo e às taxas de juros nos próximos meses. Fim.",
+    # closing quotes and brackets at a boundary and at the end of the text
+    f'Ele disse "{LONG}." E completou (sobre o mercado de crédito privado no Brasil e no exterior neste ano!) {LONG}."',
+    f'{LONG}.” \n',
+    f"{LONG}?)   {LONG}!’",
+    # accents broken by the PDF extraction
+    f"A posiçªo em aŒes de energia Ø relevante e a alocaçªo em Æreas de {LONG}. Nªo houve mudança ª vista.",
+    # line breaks, repeated spaces and non-letter heavy sentences
+    f"{LONG}.\n\n{LONG}\n continua.   Tabela: 1,2% 3,4% 5,6% 7,8% 9,0% 1,1% 2,2% 3,3%. {LONG}!",
+    "",
+    "   \n ",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("min_tokens", [1, 20])
+def test_sentence_chunks_match_legacy(text, min_tokens):
+    assert sentence_chunks(text, min_tokens=min_tokens) == legacy_sentence_chunks(text, min_tokens=min_tokens)
+
+def test_sentence_chunks_match_legacy_on_random_text():
+    rng = random.Random(19)
+    pieces = ["mercado", "juros", "recu-\nperação", "ªo", "Œ", "Ø", "Æ", ".", "!", "?", '"', "”", "’", ")", "]", " ", "  ", "\n", "\n\n", "3,5%"]
+
+    for _ in range(500):
+        text = "".join(rng.choice(pieces) + rng.choice([" ", "", "\n"]) for _ in range(rng.randint(0, 80)))
+
+        assert sentence_chunks(text, min_tokens=1) == legacy_sentence_chunks(text, min_tokens=1), repr(text)
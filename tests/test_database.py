@@ -0,0 +1,72 @@
+import sqlite3
+import pytest
+
+from services.database import DatabasePipeline
+
+
+def make_letter(title, content="texto", gestora="Gestora"):
+    return {"gestora": gestora, "title": title, "date": "2024-01-01", "url": "https://example.com", "content": content}
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabasePipeline(db_path=str(tmp_path / "letters.db"))
+
+def test_known_titles_only_returns_letters_with_content(db):
+    db.store(make_letter("Carta 1"))
+    db.store(make_letter("Carta 2", content=""))
+    db.store(make_letter("Carta 3", gestora="Outra"))
+
+    assert db.known_titles("Gestora") == {"Carta 1"}
+
+def test_unique_index_deduplicates_existing_database(tmp_path):
+    path = str(tmp_path / "letters.db")
+
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE letters (id INTEGER PRIMARY KEY AUTOINCREMENT, gestora TEXT, title TEXT, date TEXT, url TEXT, content TEXT)")
+    conn.executemany(
+        "INSERT INTO letters (gestora, title, content) VALUES (?, ?, ?)",
+        [("Gestora", "Carta", "a"), ("Gestora", "Carta", "b")],
+    )
+    conn.commit()
+    conn.close()
+
+    db = DatabasePipeline(db_path=path)
+
+    assert db.count_all_letters() == 1
+    assert db.exists("Gestora", "Carta")[2] == "a"
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.conn.execute("INSERT INTO letters (gestora, title) VALUES ('Gestora', 'Carta')")
+
+def test_dedupe_keeps_populated_copy_and_null_titles(tmp_path):
+    path = str(tmp_path / "letters.db")
+
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE letters (id INTEGER PRIMARY KEY AUTOINCREMENT, gestora TEXT, title TEXT, date TEXT, url TEXT, content TEXT)")
+    conn.executemany(
+        "INSERT INTO letters (gestora, title, content) VALUES (?, ?, ?)",
+        [("Gestora", "Carta", ""), ("Gestora", "Carta", "texto"), ("Gestora", None, "a"), ("Gestora", None, "b")],
+    )
+    conn.commit()
+    conn.close()
+
+    db = DatabasePipeline(db_path=path)
+
+    assert db.count_all_letters() == 3
+    assert db.exists("Gestora", "Carta")[2] == "texto"
+
+def test_store_many_only_fills_empty_content(db):
+    db.store_many([make_letter("Carta 1", content=""), make_letter("Carta 2")])
+    db.store_many([make_letter("Carta 1", content="novo"), make_letter("Carta 2", content="outro")])
+
+    assert db.count_all_letters() == 2
+    assert db.exists("Gestora", "Carta 1")[2] == "novo"
+    assert db.exists("Gestora", "Carta 2")[2] == "texto"
+
+def test_checkpoint_roundtrip(db):
+    assert db.checkpoint("Gestora") is None
+
+    db.save_checkpoint("Gestora", 3, "https://example.com/?page=3")
+    db.save_checkpoint("Gestora", 4, "https://example.com/?page=4", complete=True)
+
+    assert db.checkpoint("Gestora") == {"last_page": 4, "last_url": "https://example.com/?page=4", "complete": True}
@@ -0,0 +1,61 @@
+import pytest
+import torch
+from transformers import BertTokenizerFast
+
+from packing import DocumentMaskCollator, iter_blocks
+
+PAD, CLS, SEP = 0, 2, 3
+
+
+@pytest.fixture
+def tokenizer(tmp_path):
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [f"w{i}" for i in range(20)]))
+
+    return BertTokenizerFast(vocab_file=str(vocab))
+
+def test_short_input_yields_one_padded_block():
+    blocks = list(iter_blocks([[CLS, 10, 11, SEP], [CLS, 12, SEP]], CLS, PAD, block_size=8))
+
+    assert blocks == [{
+        "input_ids": [CLS, 10, 11, SEP, 12, SEP, PAD, PAD],
+        "attention_mask": [1, 1, 1, 1, 1, 1, 0, 0],
+        "document_ids": [0, 0, 0, 0, 1, 1, -1, -1],
+    }]
+
+def test_exact_fit_has_no_padded_block():
+    blocks = list(iter_blocks([[CLS, 10, 11, SEP], [CLS, 12, 13, SEP]], CLS, PAD, block_size=7))
+
+    assert blocks == [{
+        "input_ids": [CLS, 10, 11, SEP, 12, 13, SEP],
+        "attention_mask": [1] * 7,
+        "document_ids": [0, 0, 0, 0, 1, 1, 1],
+    }]
+
+def test_chunk_carries_over_to_next_block():
+    blocks = list(iter_blocks([[CLS, 10, 11, SEP], [CLS, 12, 13, 14, 15, SEP]], CLS, PAD, block_size=6))
+
+    # every block opens with [CLS], the second chunk continues after it
+    assert [block["input_ids"] for block in blocks] == [[CLS, 10, 11, SEP, 12, 13], [CLS, 14, 15, SEP, PAD, PAD]]
+    assert [block["document_ids"] for block in blocks] == [[0, 0, 0, 0, 1, 1], [1, 1, 1, 1, -1, -1]]
+    assert blocks[1]["attention_mask"] == [1, 1, 1, 1, 0, 0]
+
+def test_collator_builds_block_diagonal_mask_and_positions(tokenizer):
+    block = next(iter_blocks([[CLS, 10, 11, SEP], [CLS, 12, SEP]], CLS, PAD, block_size=8))
+    collator = DocumentMaskCollator(tokenizer=tokenizer, mlm=True, mlm_probability=0.15)
+
+    batch = collator([dict(block)])
+    document_ids = torch.tensor(block["document_ids"])
+
+    expected = (document_ids[:, None] == document_ids[None, :]).long()
+
+    assert batch["attention_mask"].shape == (1, 8, 8)
+    assert torch.equal(batch["attention_mask"][0], expected)
+    assert batch["attention_mask"][0, 1, 4] == 0   # no attention across chunks
+    assert batch["attention_mask"][0, 4, 6] == 0   # nor from real tokens to padding
+
+    assert batch["position_ids"][0].tolist() == [0, 1, 2, 3, 0, 1, 0, 1]
+
+    # padding is never a prediction target
+    assert (batch["labels"][0, 6:] == -100).all()
+    assert "document_ids" not in batch